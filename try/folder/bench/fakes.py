@@ -0,0 +1,130 @@
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import random
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, StreamingResponse
+
+# Local stand-ins for SerpAPI, the web and Groq, configured through BENCH_* env vars
+CORPUS_URL = os.getenv("BENCH_CORPUS_URL", "http://127.0.0.1:8901")
+SERP_LATENCY = float(os.getenv("BENCH_SERP_LATENCY", "0.3"))
+SERP_RESULTS = int(os.getenv("BENCH_SERP_RESULTS", "10"))
+PAGE_LATENCY = float(os.getenv("BENCH_PAGE_LATENCY", "0.2"))
+PAGE_JITTER = float(os.getenv("BENCH_PAGE_JITTER", "0.1"))
+PAGE_KB = int(os.getenv("BENCH_PAGE_KB", "64"))
+# Every Nth page is slow (0 disables), like dead hosts in real results
+SLOW_EVERY = int(os.getenv("BENCH_SLOW_EVERY", "4"))
+SLOW_LATENCY = float(os.getenv("BENCH_SLOW_LATENCY", "5"))
+LLM_LATENCY = float(os.getenv("BENCH_LLM_LATENCY", "0.8"))
+LLM_TOKENS = int(os.getenv("BENCH_LLM_TOKENS", "200"))
+SCORES = [int(s) for s in os.getenv("BENCH_SCORES", "6,8,9").split(",")]
+CONFIDENCE = float(os.getenv("BENCH_CONFIDENCE", "0.8"))
+
+WORDS = ("software testing unit integration regression test case coverage assertion fixture mock "
+         "boundary value equivalence partition defect lifecycle acceptance exploratory automation").split()
+
+
+def page_id(url: str) -> int:
+    return int(hashlib.md5(url.encode()).hexdigest()[:8], 16)
+
+
+# --- SerpAPI -----------------------------------------------------------------
+
+serp_app = FastAPI()
+
+
+@serp_app.get("/search.json")
+async def search(q: str = "", num: int = 10):
+    await asyncio.sleep(SERP_LATENCY)
+    base = page_id(q) % 10000
+    return {
+        "search_metadata": {"status": "Success"},
+        "organic_results": [
+            {"position": i + 1, "title": f"Result {i + 1}", "link": f"{CORPUS_URL}/page/{base + i}"}
+            for i in range(min(num, SERP_RESULTS))
+        ]
+    }
+
+
+# --- Static HTML corpus ------------------------------------------------------
+
+corpus_app = FastAPI()
+
+
+def render_page(page: int, kb: int) -> str:
+    rng = random.Random(page)
+    blocks = []
+    size = 0
+    while size < kb * 1024:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(12, 40))).capitalize() + "."
+        tag = rng.choice(("p", "p", "p", "li", "h2", "div"))
+        blocks.append(f"<{tag}>{sentence}</{tag}>")
+        size += len(sentence) + 10
+    return (
+        "<html><head><title>Page {0}</title><script>var tracking = {0};</script></head>"
+        "<body><nav><a href='/'>Home</a></nav>{1}<footer>Footer</footer></body></html>"
+    ).format(page, "".join(blocks))
+
+
+@corpus_app.get("/page/{page}")
+async def page(page: int, kb: int = 0):
+    slow = SLOW_EVERY and page % SLOW_EVERY == 0
+    await asyncio.sleep(SLOW_LATENCY if slow else PAGE_LATENCY + random.uniform(0, PAGE_JITTER))
+    return HTMLResponse(render_page(page, kb or PAGE_KB), headers={"ETag": f'"{page}"'})
+
+
+# --- Groq (OpenAI compatible chat completions) ------------------------------
+
+groq_app = FastAPI()
+score_cycle = itertools.cycle(SCORES)
+calls = {"refiner": 0}
+
+
+def completion_text(prompt: str, model: str) -> str:
+    if "Critique the answer constructively" in prompt:
+        calls[f"critic:{model}"] = calls.get(f"critic:{model}", 0) + 1
+        return json.dumps({
+            "score": next(score_cycle), "confidence": CONFIDENCE, "feedback": "Add concrete examples and test cases."
+        })
+    calls["refiner"] += 1
+    rng = random.Random(prompt)
+    return " ".join(rng.choice(WORDS) for _ in range(LLM_TOKENS))
+
+
+@groq_app.post("/openai/v1/chat/completions")
+async def chat(request: Request):
+    body = await request.json()
+    text = completion_text(body["messages"][-1]["content"], body["model"])
+    created = int(time.time())
+
+    if not body.get("stream"):
+        await asyncio.sleep(LLM_LATENCY)
+        return {
+            "id": "bench", "object": "chat.completion", "created": created, "model": body["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        }
+
+    async def tokens():
+        words = text.split(" ")
+        # Half the latency before the first token, the rest spread over the tokens
+        await asyncio.sleep(LLM_LATENCY / 2)
+        for word in words:
+            chunk = {
+                "id": "bench", "object": "chat.completion.chunk", "created": created, "model": body["model"],
+                "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(LLM_LATENCY / 2 / len(words))
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(tokens(), media_type="text/event-stream")
+
+
+@groq_app.get("/calls")
+def llm_calls():
+    return calls
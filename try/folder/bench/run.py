@@ -0,0 +1,270 @@
+# Offline benchmark: starts the fakes, the registry and all agents, then drives the pipeline.
+#   python -m bench.run --requests 100 --concurrency 20 --json bench.json
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+from utils import governor
+from utils.sse import EventParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def memory_kb(pid: int) -> dict:
+    # Linux only; other platforms just report nothing
+    stats = {}
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith(("VmRSS", "VmHWM")):
+                    key, value = line.split(":", 1)
+                    stats[key] = int(value.split()[0])
+    except OSError:
+        pass
+    return stats
+
+
+class Stack:
+    # Fakes, registry and the three agents as uvicorn subprocesses wired to each other
+    def __init__(self, args):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix="bench-")
+        self.ports = {name: free_port() for name in ("serp", "corpus", "groq", "registry", "refiner", "critic", "scraper")}
+        self.procs = {}
+
+    def url(self, name):
+        return f"http://127.0.0.1:{self.ports[name]}"
+
+    def env(self, **extra):
+        env = dict(os.environ)
+        env.update({
+            "PYTHONPATH": ROOT,
+            "REGISTRY_URL": self.url("registry"),
+            "GROQ_API_KEY": "bench",
+            "GROQ_API_BASE": self.url("groq"),
+            "SERP_API_KEY": "bench",
+            "SERPAPI_URL": f"{self.url('serp')}/search.json",
+            "SERP_CACHE_PATH": os.path.join(self.workdir, "serp.sqlite"),
+            "PAGE_CACHE_PATH": os.path.join(self.workdir, "pages.sqlite"),
+            "VERDICT_CACHE_PATH": os.path.join(self.workdir, "verdicts.sqlite"),
+            "BLOB_STORE_PATH": os.path.join(self.workdir, "blobs.sqlite"),
+            "SINGLE_FLIGHT_PATH": os.path.join(self.workdir, "flights.sqlite"),
+            "HOST_STATS_PATH": os.path.join(self.workdir, "hosts.sqlite"),
+            "JOB_STORE_PATH": os.path.join(self.workdir, "jobs.sqlite"),
+            "GOVERNOR_PATH": os.path.join(self.workdir, "governor.sqlite"),
+            # The whole corpus is served from one host
+            "HOST_CONCURRENCY": "1000",
+            "HEARTBEAT_INTERVAL": "2",
+            # The fakes have no quota; keep the governor out of the measurements
+            "GOVERNOR_LIMITS": json.dumps({
+                key: {"rate": 1000, "burst": 1000, "concurrency": 1000} for key in governor.DEFAULT_LIMITS
+            }),
+            "BENCH_CORPUS_URL": self.url("corpus"),
+            "BENCH_SERP_LATENCY": str(self.args.serp_latency),
+            "BENCH_PAGE_LATENCY": str(self.args.page_latency),
+            "BENCH_PAGE_KB": str(self.args.page_kb),
+            "BENCH_SLOW_EVERY": str(self.args.slow_every),
+            "BENCH_SLOW_LATENCY": str(self.args.slow_latency),
+            "BENCH_LLM_LATENCY": str(self.args.llm_latency),
+            "BENCH_LLM_TOKENS": str(self.args.llm_tokens),
+            "BENCH_SCORES": self.args.scores,
+        })
+        env.update(extra)
+        return env
+
+    def start(self, name, app, **extra):
+        log = open(os.path.join(self.workdir, f"{name}.log"), "w")
+        self.procs[name] = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", app, "--port", str(self.ports[name]), "--log-level", "warning"],
+            cwd=ROOT, env=self.env(**extra), stdout=log, stderr=subprocess.STDOUT
+        )
+
+    def wait_ready(self, name, path="/", timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.procs[name].poll() is not None:
+                raise RuntimeError(f"{name} exited, see {self.workdir}/{name}.log")
+            try:
+                if httpx.get(self.url(name) + path, timeout=1).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"{name} not ready after {timeout}s, see {self.workdir}/{name}.log")
+
+    def up(self):
+        self.start("serp", "bench.fakes:serp_app")
+        self.start("corpus", "bench.fakes:corpus_app")
+        self.start("groq", "bench.fakes:groq_app")
+        self.start("registry", "registry_server:app")
+        for name in ("serp", "corpus", "groq", "registry"):
+            self.wait_ready(name, "/docs")
+        self.start("refiner", "llm_refiner:app", AGENT_URL=self.url("refiner"))
+        self.start("critic", "critic:app", AGENT_URL=self.url("critic"))
+        self.start("scraper", "scrap:app", AGENT_URL=self.url("scraper"))
+        for name in ("refiner", "critic", "scraper"):
+            self.wait_ready(name)
+
+    def down(self):
+        for proc in self.procs.values():
+            proc.terminate()
+        for proc in self.procs.values():
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+async def resolve_stage(stack, count):
+    samples = []
+    async with httpx.AsyncClient() as client:
+        for _ in range(count):
+            started = time.perf_counter()
+            await client.get(f"{stack.url('registry')}/resolve", params={"tag": "critic"})
+            samples.append(time.perf_counter() - started)
+    return samples
+
+
+async def pipeline_run(client, stack, question, stages):
+    # Stage latency = time between consecutive trace events on the scraper's SSE stream
+    started = last = time.perf_counter()
+    first_token = None
+    status = "error"
+    parser = EventParser()
+    async with client.stream(
+        "POST", f"{stack.url('scraper')}/a2a/stream",
+        json={"input": question, "context": {}}, timeout=600
+    ) as resp:
+        async for line in resp.aiter_lines():
+            parsed = parser.feed(line.rstrip("\r"))
+            if not parsed:
+                continue
+            event, data = parsed
+            now = time.perf_counter()
+            if event == "token" and first_token is None:
+                first_token = now - started
+            elif event == "trace":
+                tool = data.get("tool", "unknown")
+                stages[tool].append(now - last)
+                if "duration_ms" in data:
+                    # Time the agent itself reports for the step, without hops and queueing
+                    stages[f"{tool}_self"].append(data["duration_ms"] / 1000)
+                last = now
+            elif event == "result":
+                status = data.get("status", "error")
+    stages["end_to_end"].append(time.perf_counter() - started)
+    if first_token is not None:
+        stages["first_token"].append(first_token)
+    return status
+
+
+async def load(stack, requests, concurrency, unique):
+    stages = defaultdict(list)
+    statuses = defaultdict(int)
+    sem = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits) as client:
+        async def one(i):
+            async with sem:
+                question = f"lesson plan on software testing topic {i % unique}"
+                try:
+                    statuses[await pipeline_run(client, stack, question, stages)] += 1
+                except Exception as e:
+                    statuses[f"exception: {type(e).__name__}"] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        wall = time.perf_counter() - started
+    return stages, dict(statuses), wall
+
+
+def summarize(samples):
+    ms = [s * 1000 for s in samples]
+    return {
+        "count": len(ms),
+        "mean_ms": round(sum(ms) / len(ms), 1) if ms else 0.0,
+        "p50_ms": round(percentile(ms, 50), 1),
+        "p95_ms": round(percentile(ms, 95), 1),
+        "p99_ms": round(percentile(ms, 99), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark against local fakes")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--unique", type=int, default=50, help="distinct questions, lower values exercise caches")
+    parser.add_argument("--resolves", type=int, default=200)
+    parser.add_argument("--serp-latency", type=float, default=0.3)
+    parser.add_argument("--page-latency", type=float, default=0.2)
+    parser.add_argument("--page-kb", type=int, default=64)
+    parser.add_argument("--slow-every", type=int, default=4)
+    parser.add_argument("--slow-latency", type=float, default=5.0)
+    parser.add_argument("--llm-latency", type=float, default=0.8)
+    parser.add_argument("--llm-tokens", type=int, default=200)
+    parser.add_argument("--scores", default="6,8,9", help="critic scores the fake Groq cycles through")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    stack = Stack(args)
+    print(f"🧪 Starting stack in {stack.workdir}")
+    try:
+        stack.up()
+        resolves = asyncio.run(resolve_stage(stack, args.resolves))
+        stages, statuses, wall = asyncio.run(load(stack, args.requests, args.concurrency, args.unique))
+        llm_calls = httpx.get(f"{stack.url('groq')}/calls").json()
+        memory = {name: memory_kb(proc.pid) for name, proc in stack.procs.items()
+                  if name in ("registry", "scraper", "critic", "refiner")}
+    finally:
+        stack.down()
+
+    report = {
+        "config": vars(args),
+        "wall_s": round(wall, 2),
+        "requests_per_s": round(args.requests / wall, 2) if wall else 0.0,
+        "statuses": statuses,
+        "llm_calls": llm_calls,
+        "stages": {"registry_resolve": summarize(resolves), **{k: summarize(v) for k, v in stages.items()}},
+        "memory_kb": memory,
+    }
+
+    print(f"\n📊 {args.requests} requests, concurrency {args.concurrency}: "
+          f"{report['requests_per_s']} req/s over {report['wall_s']}s  statuses={statuses}  llm_calls={llm_calls}")
+    print(f"{'stage':<18}{'count':>7}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}  (ms)")
+    for name, s in report["stages"].items():
+        print(f"{name:<18}{s['count']:>7}{s['mean_ms']:>10}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}")
+    print("\n🧠 Memory (kB):")
+    for name, m in memory.items():
+        print(f"   {name:<10} rss={m.get('VmRSS', '?')} peak={m.get('VmHWM', '?')}")
+
+    if args.json:
+        with open(args.json, "w") as out:
+            json.dump(report, out, indent=2)
+
+
+if __name__ == "__main__":
+    main()
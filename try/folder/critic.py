@@ -1,27 +1,38 @@
 from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from langchain_groq import ChatGroq
-import os, json, requests, re
+import asyncio, os, json, re, threading, time
+from utils import blob_store, governor, http_client, metrics, sse, wire
+from utils.registration import AgentRegistration
+from utils.resolver import RegistryResolver
+from utils.bm25 import tokens
+from utils.packing import CRITIC_ANSWER_TOKENS, load_encoding, pack
+from utils.verdict_cache import VerdictCache, content_hash
 from dotenv import load_dotenv
 
 
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 REGISTRY_URL = os.getenv("REGISTRY_URL", "http://localhost:9000")
+AGENT_URL = os.getenv("AGENT_URL", "http://localhost:8002")
+CRITIC_MODEL = "llama3-70b-8192"
+CRITIC_SMALL_MODEL = os.getenv("CRITIC_SMALL_MODEL", "llama3-8b-8192")
+# Cascade tiers, tried in order until one is confident: "heuristic", "small" and "large" (CRITIC_MODEL)
+CRITIC_TIERS = [t.strip() for t in os.getenv("CRITIC_TIERS", "heuristic,small,large").split(",") if t.strip()]
+CRITIC_MIN_CONFIDENCE = float(os.getenv("CRITIC_MIN_CONFIDENCE", "0.7"))
+# Scores in this band sit too close to the accept threshold to trust a cheaper tier
+CRITIC_ESCALATE_LOW = float(os.getenv("CRITIC_ESCALATE_LOW", "6"))
+CRITIC_ESCALATE_HIGH = float(os.getenv("CRITIC_ESCALATE_HIGH", "8"))
+TIER_MODELS = {"small": CRITIC_SMALL_MODEL, "large": CRITIC_MODEL}
+if not CRITIC_TIERS or set(CRITIC_TIERS) - {"heuristic", *TIER_MODELS}:
+    raise ValueError(f"CRITIC_TIERS must list tiers from heuristic, small, large; got {CRITIC_TIERS}")
 
 app = FastAPI()
+resolver = RegistryResolver(REGISTRY_URL)
+verdicts = VerdictCache()
 
 
-llm = ChatGroq(
-    model_name="llama3-70b-8192",
-    temperature=0.2,
-    groq_api_key=GROQ_API_KEY
-)
-
-critic_prompt = PromptTemplate.from_template(
-    """You are an educational critic reviewing an AI assistant's web-scraped answer to a student's question.
+CRITIC_TEMPLATE = """You are an educational critic reviewing an AI assistant's web-scraped answer to a student's question.
 
 Question:
 {question}
@@ -33,11 +44,42 @@ Critique the answer constructively. Then provide a numeric score from 1 (poor) t
 
 {{
   "score": <1-10>,
+  "confidence": <0.0-1.0, how sure you are about the score>,
   "feedback": "<clear constructive feedback>"
 }}"""
-)
 
-chain = LLMChain(llm=llm, prompt=critic_prompt)
+# Everything that decides a verdict; part of its cache key so a config change never serves stale verdicts
+CASCADE_CONFIG = json.dumps({
+    "tiers": CRITIC_TIERS,
+    "models": TIER_MODELS,
+    "min_confidence": CRITIC_MIN_CONFIDENCE,
+    "escalate": [CRITIC_ESCALATE_LOW, CRITIC_ESCALATE_HIGH],
+    "template": content_hash(CRITIC_TEMPLATE)
+}, sort_keys=True)
+
+_chains = {}
+_chains_lock = threading.Lock()
+
+def get_chain(model=CRITIC_MODEL):
+    # langchain is slow to import, so chains are built on first use (or by the startup warm-up)
+    chain = _chains.get(model)
+    if chain is None:
+        with _chains_lock:
+            chain = _chains.get(model)
+            if chain is None:
+                from langchain.prompts import PromptTemplate
+                from langchain.chains import LLMChain
+                from langchain_groq import ChatGroq
+
+                llm = ChatGroq(
+                    model_name=model,
+                    temperature=0.2,
+                    groq_api_key=GROQ_API_KEY,
+                    # The governor owns retries, so throttled calls back off together
+                    max_retries=0
+                )
+                chain = _chains[model] = LLMChain(llm=llm, prompt=PromptTemplate.from_template(CRITIC_TEMPLATE))
+    return chain
 
 AGENT_CARD = {
     "id": "critic-tool",
@@ -45,15 +87,29 @@ AGENT_CARD = {
     "version": "1.0.0",
     "description": "Provides feedback and scoring for scraped answers",
     "tags": ["critic"],
-    "endpoints": {"a2a": "http://localhost:8002/a2a"},
+    "endpoints": {"a2a": f"{AGENT_URL}/a2a", "stream": f"{AGENT_URL}/a2a/stream"},
     "auth": {"type": "none"}
 }
 
-try:
-    res = requests.post(f"{REGISTRY_URL}/register", json=AGENT_CARD)
-    print("✅ Registered with registry:", res.json())
-except Exception as e:
-    print("❌ Failed to register with registry:", e)
+registration = AgentRegistration(REGISTRY_URL, AGENT_CARD)
+registration.install(app)
+metrics.install(app)
+wire.install(app)
+blob_store.install(app)
+metrics.register_stats("verdict", verdicts.info)
+metrics.register_stats("cascade", lambda: cascade_info())
+metrics.register_stats("resolver", lambda: resolver.stats)
+metrics.register_stats("governor", governor.info)
+
+@app.on_event("startup")
+def warm_up():
+    # Load the tokenizer, import langchain and build the chains off the request path while registration runs
+    def build():
+        load_encoding()
+        for tier in CRITIC_TIERS:
+            if tier in TIER_MODELS:
+                get_chain(TIER_MODELS[tier])
+    threading.Thread(target=build, name="chain-warmup", daemon=True).start()
 
 @app.get("/.well-known/agent.json")
 def agent_card():
@@ -67,118 +123,263 @@ class A2ARequest(BaseModel):
 
 MAX_ITER = 2
 
-@app.post("/a2a")
-def a2a_handler(req: A2ARequest):
-    question = req.input
-    answer = req.context.get("answer", "")
-    phase = req.context.get("phase", "initial")
-    iterations = req.context.get("iterations", 0)
-    trace = req.pipeline_trace or []
-
-    print(f" [CRITIC] Phase: {phase}, Iteration: {iterations}")
-
-    try:
-        result = chain.invoke({
+ERROR_MARKERS = ("❌", "⚠️", "[Refiner failed]", "[No answer")
+cascade_stats = {"heuristic": 0, "small": 0, "large": 0, "escalated": 0}
+
+def cascade_info() -> dict:
+    decided = cascade_stats["heuristic"] + cascade_stats["small"] + cascade_stats["large"]
+    return {
+        **cascade_stats,
+        "tiers": ",".join(CRITIC_TIERS),
+        # Share of fresh verdicts that needed the expensive model
+        "large_rate": round(cascade_stats["large"] / decided, 3) if decided else 0.0,
+        "escalations_per_verdict": round(cascade_stats["escalated"] / decided, 3) if decided else 0.0
+    }
+
+def heuristic_verdict(question: str, answer: str):
+    # Deterministic verdicts for answers that are obviously unusable, None when it takes a model to judge
+    text = answer.strip()
+    if not text or text.startswith(ERROR_MARKERS) or len(text.split()) < 30:
+        return {"score": 1, "confidence": 1.0,
+                "feedback": "The answer is empty or an error message. Gather real content that addresses the question."}
+
+    question_terms = set(tokens(question))
+    if question_terms and not question_terms & set(tokens(text)):
+        return {"score": 2, "confidence": 0.9,
+                "feedback": "The answer does not address the question at all. Replace it with on-topic content."}
+
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if len(lines) >= 5 and len(set(lines)) / len(lines) < 0.5:
+        return {"score": 3, "confidence": 0.8,
+                "feedback": "Most of the answer is repeated boilerplate. Keep only the substantive explanation."}
+    return None
+
+async def llm_verdict(model: str, question: str, answer: str):
+    chain = await asyncio.to_thread(get_chain, model)
+    with metrics.LLM_ERRORS.labels(model, "critique").count_exceptions(), \
+            metrics.LLM_LATENCY.labels(model, "critique").time():
+        result = await governor.call("groq", model, lambda: chain.ainvoke({
             "question": question,
-            "answer": answer
-        })
+            # Long answers keep the sentences most relevant to the question
+            "answer": pack(answer, CRITIC_ANSWER_TOKENS, question)
+        }))
 
+    result_text = result if isinstance(result, str) else result.get("text", str(result))
+    print(f" Raw Critic Result ({model}):\n{result_text}")
 
-        result_text = result if isinstance(result, str) else result.get("text", str(result))
-        print(f" Raw Critic Result:\n{result_text}")
+    match = re.search(r"\{[\s\S]*?\}", result_text)
+    json_str = match.group(0) if match else result_text
 
-        
-        match = re.search(r"\{[\s\S]*?\}", result_text)
-        json_str = match.group(0) if match else result_text
+    try:
+        parsed = json.loads(json_str)
+    except Exception as json_error:
+        print(f"❌ JSON parse error: {json_error}")
+        return None
 
+    try:
+        confidence = float(parsed.get("confidence", 0))
+    except (TypeError, ValueError):
+        confidence = 0.0
+    return {
+        "score": parsed.get("score", 0),
+        "confidence": confidence,
+        "feedback": parsed.get("feedback", "[No feedback returned]")
+    }
+
+def confident(verdict: dict) -> bool:
+    try:
+        score = float(verdict["score"])
+    except (TypeError, ValueError):
+        return False
+    return verdict["confidence"] >= CRITIC_MIN_CONFIDENCE and not (
+        CRITIC_ESCALATE_LOW <= score <= CRITIC_ESCALATE_HIGH
+    )
+
+async def critique(question: str, answer: str):
+    # Returns (verdict, cached); verdict is None when no tier produced a valid one
+    verdict_key = content_hash(CASCADE_CONFIG, question, answer)
+    verdict = verdicts.get(verdict_key)
+    if verdict is not None:
+        # Same question and answer always get the same verdict, skip the LLM call
+        print(" Critic verdict served from cache")
+        return verdict, True
+
+    for position, tier in enumerate(CRITIC_TIERS):
+        if tier == "heuristic":
+            verdict = heuristic_verdict(question, answer)
+        else:
+            verdict = await llm_verdict(TIER_MODELS[tier], question, answer)
+        if verdict is not None and (position == len(CRITIC_TIERS) - 1 or confident(verdict)):
+            verdict["tier"] = tier
+            break
+        if position < len(CRITIC_TIERS) - 1:
+            cascade_stats["escalated"] += 1
+            print(f" Critic tier '{tier}' not confident, escalating")
+        verdict = None
+
+    if verdict is None:
+        return None, False
+    cascade_stats[verdict["tier"]] += 1
+    metrics.CRITIC_VERDICTS.labels(verdict["tier"]).inc()
+    verdicts.put(verdict_key, verdict)
+    return verdict, False
+
+def refinement_payload(question: str, answer: str, feedback: str, iterations: int, trace: list) -> dict:
+    return {
+        "input": question,
+        "context": {
+            "answer": answer,
+            "feedback": feedback,
+            "iterations": iterations,
+            "phase": "refined"
+        },
+        "pipeline_trace": trace,
+        "intent": "refine_low_score_response"
+    }
+
+async def request_refinement(question: str, answer: str, feedback: str, iterations: int, trace: list):
+    async with resolver.ause("llm") as refiner_url:
+        if not refiner_url:
+            return None
+
+        print(f" Forwarding to LLM Refiner: {refiner_url}")
+        res = await http_client.get_async_client().post(
+            url=refiner_url,
+            timeout=60,
+            **wire.json_body(refinement_payload(question, answer, feedback, iterations, trace))
+        )
+        return res.json()
+
+async def stream_refinement(question: str, answer: str, feedback: str, iterations: int, trace: list):
+    # Relays the refiner's token and trace events; its "result" event carries the improved answer
+    async with resolver.ause("llm", "stream") as refiner_url:
+        if not refiner_url:
+            # Refiner does not advertise a stream endpoint, fall back to a plain A2A call
+            result = await request_refinement(question, answer, feedback, iterations, trace)
+            if result is not None:
+                yield "result", result
+            return
+
+        print(f" Streaming from LLM Refiner: {refiner_url}")
+        payload = refinement_payload(question, answer, feedback, iterations, trace)
+        async for event, data in sse.relay(refiner_url, payload, timeout=60):
+            yield event, data
+
+async def critique_loop(question: str, answer: str, phase: str, iterations: int, trace: list, stream=False):
+    # critique -> refine -> critique ... until the score is good enough or MAX_ITER is reached.
+    # Yields ("trace", step) and ("token", chunk) as they happen and ("result", response) last.
+    while True:
+        print(f" [CRITIC] Phase: {phase}, Iteration: {iterations}")
+
+        started = time.time()
         try:
-            parsed = json.loads(json_str)
-        except Exception as json_error:
-            print(f"❌ JSON parse error: {json_error}")
-            trace.append({
+            verdict, cached = await critique(question, answer)
+            if verdict is None:
+                step = metrics.timed({
+                    "tool": "critic",
+                    "status": "error",
+                    "feedback": "[Invalid JSON format]",
+                    "score": 0,
+                    "phase": phase
+                }, started)
+                trace.append(step)
+                yield "trace", step
+                yield "result", {"answer": answer, "pipeline_trace": trace, "status": "error"}
+                return
+
+            score = verdict["score"]
+            feedback = verdict["feedback"]
+
+            step = metrics.timed({
                 "tool": "critic",
-                "status": "error",
-                "feedback": "[Invalid JSON format]",
-                "score": 0,
-                "phase": phase
-            })
-            return {"answer": answer, "pipeline_trace": trace, "status": "error"}
-
-        score = parsed.get("score", 0)
-        feedback = parsed.get("feedback", "[No feedback returned]")
-
-        trace.append({
-            "tool": "critic",
-            "status": "ok",
-            "phase": phase,
-            "score": score,
-            "feedback": feedback
-        })
-
-        if score >= 9 or iterations >= MAX_ITER:
-            return {
-                "status": "complete",
+                "status": "ok",
                 "phase": phase,
-                "answer": answer,
                 "score": score,
                 "feedback": feedback,
-                "pipeline_trace": trace
-            }
-
-        # Forward to LLM Refiner
-        try:
-            res = requests.get(f"{REGISTRY_URL}/resolve?tag=llm")
-            refiner_url = res.json().get("endpoints", {}).get("a2a")
-        except:
-            refiner_url = None
-
-        if not refiner_url:
-            return {
-                "status": "incomplete",
-                "note": "No LLM refiner found.",
-                "pipeline_trace": trace
-            }
-
-        print(f" Forwarding to LLM Refiner: {refiner_url}")
-        refine_response = requests.post(
-            url=refiner_url,
-            json={
-                "input": question,
-                "context": {
+                "tier": verdict.get("tier"),
+                "cached": cached
+            }, started)
+            trace.append(step)
+            yield "trace", step
+
+            if score >= 9 or iterations >= MAX_ITER:
+                yield "result", {
+                    "status": "complete",
+                    "phase": phase,
                     "answer": answer,
+                    "score": score,
                     "feedback": feedback,
-                    "iterations": iterations + 1,
-                    "phase": "refined"
-                },
-                "pipeline_trace": trace,
-                "intent": "refine_low_score_response"
-            },
-            timeout=60
-        ).json()
-
-        improved_answer = refine_response.get("answer", "[Refiner failed]")
-        return a2a_handler(A2ARequest(
-            input=question,
-            context={
-                "answer": improved_answer,
-                "phase": "refined",
-                "iterations": iterations + 1
-            },
-            pipeline_trace=refine_response.get("pipeline_trace", trace)
-        ))
-
-    except Exception as e:
-        print(f" Exception during critique: {e}")
-        trace.append({
-            "tool": "critic",
-            "status": "error",
-            "feedback": f"[Error: {e}]",
-            "score": 0,
-            "phase": phase
-        })
-        return {"answer": answer, "pipeline_trace": trace, "status": "error"}
+                    "pipeline_trace": trace
+                }
+                return
+
+            refine_response = None
+            if stream:
+                async for event, data in stream_refinement(question, answer, feedback, iterations + 1, trace):
+                    if event == "result":
+                        refine_response = data
+                    else:
+                        yield event, data
+            else:
+                refine_response = await request_refinement(question, answer, feedback, iterations + 1, trace)
+
+            if refine_response is None:
+                yield "result", {
+                    "status": "incomplete",
+                    "note": "No LLM refiner found.",
+                    "pipeline_trace": trace
+                }
+                return
+
+            answer = refine_response.get("answer", "[Refiner failed]")
+            trace = refine_response.get("pipeline_trace", trace)
+            phase = "refined"
+            iterations += 1
+
+        except Exception as e:
+            print(f" Exception during critique: {e}")
+            step = metrics.timed({
+                "tool": "critic",
+                "status": "error",
+                "feedback": f"[Error: {e}]",
+                "score": 0,
+                "phase": phase
+            }, started)
+            trace.append(step)
+            yield "trace", step
+            yield "result", {"answer": answer, "pipeline_trace": trace, "status": "error"}
+            return
+
+def loop_args(req: A2ARequest):
+    return (
+        req.input,
+        req.context.get("answer", ""),
+        req.context.get("phase", "initial"),
+        req.context.get("iterations", 0),
+        # Callers that still inline large fields get them swapped for references before the next hop
+        blob_store.pack_trace(req.pipeline_trace or [], AGENT_URL)
+    )
+
+@app.post("/a2a")
+async def a2a_handler(req: A2ARequest):
+    result = None
+    async for event, data in critique_loop(*loop_args(req)):
+        if event == "result":
+            result = data
+    return result
+
+@app.post("/a2a/stream")
+async def a2a_stream(req: A2ARequest):
+    events = critique_loop(*loop_args(req), stream=True)
+    return StreamingResponse(sse.encode(events), media_type="text/event-stream", headers=sse.HEADERS)
 
 
 @app.get("/")
 def health_check():
-    return {"status": "Critic tool (A2A-enabled) is running"}
+    return {
+        "status": "Critic tool (A2A-enabled) is running",
+        "registered": registration.registered.is_set(),
+        "pool": http_client.pool_stats(),
+        "verdict_cache": verdicts.info(),
+        "cascade": cascade_info()
+    }
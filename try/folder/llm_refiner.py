@@ -1,26 +1,22 @@
 from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from langchain_groq import ChatGroq
-import os, json, requests
+import asyncio, os, json, threading, time
+from utils import governor, http_client, metrics, sse, wire
+from utils.packing import REFINER_ANSWER_TOKENS, REFINER_FEEDBACK_TOKENS, load_encoding, pack_fields
+from utils.registration import AgentRegistration
 from dotenv import load_dotenv
 
 
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 REGISTRY_URL = os.getenv("REGISTRY_URL", "http://localhost:9000")
+AGENT_URL = os.getenv("AGENT_URL", "http://localhost:8003")
+REFINER_MODEL = "llama3-70b-8192"
 
 app = FastAPI()
 
-llm = ChatGroq(
-    model_name="llama3-70b-8192",
-    temperature=0.5,
-    groq_api_key=GROQ_API_KEY
-)
-
-refiner_prompt = PromptTemplate.from_template(
-    """You are a helpful AI tutor tasked with improving an assistant's answer based on critique feedback.
+REFINER_TEMPLATE = """You are a helpful AI tutor tasked with improving an assistant's answer based on critique feedback.
 
 Question:
 {question}
@@ -35,9 +31,31 @@ Update the answer to address **every issue** raised by the critic. Be specific,
 
 Return only the improved answer below:
 """
-)
 
-refine_chain = LLMChain(llm=llm, prompt=refiner_prompt)
+_chains = None
+_chains_lock = threading.Lock()
+
+def get_chains():
+    # (refine_chain, refine_stream), built on first use since langchain is slow to import
+    global _chains
+    if _chains is None:
+        with _chains_lock:
+            if _chains is None:
+                from langchain.prompts import PromptTemplate
+                from langchain.chains import LLMChain
+                from langchain_groq import ChatGroq
+
+                llm = ChatGroq(
+                    model_name=REFINER_MODEL,
+                    temperature=0.5,
+                    groq_api_key=GROQ_API_KEY,
+                    # The governor owns retries, so throttled calls back off together
+                    max_retries=0
+                )
+                refiner_prompt = PromptTemplate.from_template(REFINER_TEMPLATE)
+                # Same prompt, but the second one yields message chunks so tokens can be streamed
+                _chains = LLMChain(llm=llm, prompt=refiner_prompt), refiner_prompt | llm
+    return _chains
 
 AGENT_CARD = {
     "id": "llm-refiner",
@@ -45,15 +63,23 @@ AGENT_CARD = {
     "version": "1.0.0",
     "description": "Improves answers based on critic feedback",
     "tags": ["llm"],
-    "endpoints": {"a2a": "http://localhost:8003/a2a"},
+    "endpoints": {"a2a": f"{AGENT_URL}/a2a", "stream": f"{AGENT_URL}/a2a/stream"},
     "auth": {"type": "none"}
 }
 
-try:
-    res = requests.post(f"{REGISTRY_URL}/register", json=AGENT_CARD)
-    print("✅ Registered with registry:", res.json())
-except Exception as e:
-    print("❌ Failed to register with registry:", e)
+registration = AgentRegistration(REGISTRY_URL, AGENT_CARD)
+registration.install(app)
+metrics.install(app)
+metrics.register_stats("governor", governor.info)
+wire.install(app)
+
+@app.on_event("startup")
+def warm_up():
+    # Load the tokenizer, import langchain and build the chains off the request path while registration runs
+    def build():
+        load_encoding()
+        get_chains()
+    threading.Thread(target=build, name="chain-warmup", daemon=True).start()
 
 @app.get("/.well-known/agent.json")
 def agent_card():
@@ -65,8 +91,14 @@ class A2ARequest(BaseModel):
     pipeline_trace: list = []
     intent: str = ""
 
+PROMPT_BUDGETS = {"answer": REFINER_ANSWER_TOKENS, "feedback": REFINER_FEEDBACK_TOKENS}
+
+def prompt_fields(question: str, answer: str, feedback: str) -> dict:
+    # Answer and feedback are cut to their token budgets, keeping what is most relevant to the question
+    return pack_fields({"question": question, "answer": answer, "feedback": feedback}, PROMPT_BUDGETS, question)
+
 @app.post("/a2a")
-def a2a_handler(req: A2ARequest):
+async def a2a_handler(req: A2ARequest):
     question = req.input
     original_answer = req.context.get("answer", "")
     feedback = req.context.get("feedback", "")
@@ -74,18 +106,20 @@ def a2a_handler(req: A2ARequest):
 
     print("🌟 [LLM Refiner] Improving answer...")
 
+    started = time.time()
     try:
-        improved_answer = refine_chain.run({
-            "question": question,
-            "answer": original_answer,
-            "feedback": feedback
-        }).strip()
-
-        trace.append({
+        refine_chain, _ = await asyncio.to_thread(get_chains)
+        with metrics.LLM_ERRORS.labels(REFINER_MODEL, "refine").count_exceptions(), \
+                metrics.LLM_LATENCY.labels(REFINER_MODEL, "refine").time():
+            fields = prompt_fields(question, original_answer, feedback)
+            result = await governor.call("groq", REFINER_MODEL, lambda: refine_chain.ainvoke(fields))
+        improved_answer = result["text"].strip()
+
+        trace.append(metrics.timed({
             "tool": "llm",
             "status": "ok",
             "phase": "refined"
-        })
+        }, started))
 
         return {
             "answer": improved_answer,
@@ -95,18 +129,77 @@ def a2a_handler(req: A2ARequest):
 
     except Exception as e:
         print(f"❌ [LLM Refiner Error] {e}")
-        trace.append({
+        trace.append(metrics.timed({
             "tool": "llm",
             "status": "error",
             "phase": "refined",
             "error": str(e)
-        })
+        }, started))
         return {
             "answer": "[Refiner failed]",
             "pipeline_trace": trace,
             "status": "error"
         }
 
+async def refine_events(req: A2ARequest):
+    question = req.input
+    original_answer = req.context.get("answer", "")
+    feedback = req.context.get("feedback", "")
+    trace = req.pipeline_trace or []
+
+    print("🌟 [LLM Refiner] Streaming improved answer...")
+
+    started = time.time()
+    try:
+        parts = []
+        _, refine_stream = await asyncio.to_thread(get_chains)
+        with metrics.LLM_ERRORS.labels(REFINER_MODEL, "refine_stream").count_exceptions():
+            fields = prompt_fields(question, original_answer, feedback)
+            async for chunk in governor.stream("groq", REFINER_MODEL, lambda: refine_stream.astream(fields)):
+                if chunk.content:
+                    if not parts:
+                        metrics.LLM_FIRST_TOKEN.labels(REFINER_MODEL, "refine_stream").observe(time.time() - started)
+                    parts.append(chunk.content)
+                    yield "token", {"text": chunk.content}
+        metrics.LLM_LATENCY.labels(REFINER_MODEL, "refine_stream").observe(time.time() - started)
+
+        step = metrics.timed({
+            "tool": "llm",
+            "status": "ok",
+            "phase": "refined"
+        }, started)
+        trace.append(step)
+        yield "trace", step
+        yield "result", {
+            "answer": "".join(parts).strip(),
+            "pipeline_trace": trace,
+            "status": "complete"
+        }
+
+    except Exception as e:
+        print(f"❌ [LLM Refiner Error] {e}")
+        step = metrics.timed({
+            "tool": "llm",
+            "status": "error",
+            "phase": "refined",
+            "error": str(e)
+        }, started)
+        trace.append(step)
+        yield "trace", step
+        yield "result", {
+            "answer": "[Refiner failed]",
+            "pipeline_trace": trace,
+            "status": "error"
+        }
+
+@app.post("/a2a/stream")
+async def a2a_stream(req: A2ARequest):
+    return StreamingResponse(sse.encode(refine_events(req)), media_type="text/event-stream", headers=sse.HEADERS)
+
 @app.get("/")
 def health_check():
-    return {"status": "LLM Refiner tool is running"}
+    return {
+        "status": "LLM Refiner tool is running",
+        "registered": registration.registered.is_set(),
+        "pool": http_client.pool_stats()
+    }
@@ -1,5 +1,7 @@
-import requests
+from utils import http_client, sse
 import json
+import sys
+import time
 
 
 REGISTRY_URL = "http://localhost:9000"
@@ -7,24 +9,129 @@ ENTRY_TAG = "entry"
 
 def resolve_entrypoint():
     try:
-        res = requests.get(f"{REGISTRY_URL}/resolve", params={"tag": ENTRY_TAG})
-        return res.json().get("endpoints", {}).get("ask")
+        res = http_client.get(f"{REGISTRY_URL}/resolve", params={"tag": ENTRY_TAG})
+        return res.json().get("endpoints", {})
     except Exception as e:
         print(f"❌ Failed to resolve entrypoint from registry: {e}")
-        return None
+        return {}
+
+def print_step(i, step):
+    print(f"\n🔧 Step {i} - Tool: {step.get('tool')}")
+    for k, v in step.items():
+        if isinstance(v, dict) and "$blob" in v:
+            # Large fields travel as references, fetch them from v["url"] when the full text is needed
+            print(f"   • {k}: <{v.get('size', '?')} chars at {v.get('url')}>")
+        elif k not in ("tool", "seq"):
+            print(f"   • {k}: {str(v)[:400]}{'...' if len(str(v)) > 400 else ''}")
+
+def stream_answer(stream_url, question, intent):
+    # Render trace steps and refiner tokens as the pipeline produces them
+    print("\n📡 Streaming from pipeline...")
+    data = {}
+    steps = 0
+    in_tokens = False
+    with http_client.post(
+        stream_url,
+        json={"input": question, "context": {}, "intent": intent},
+        stream=True,
+        timeout=300
+    ) as response:
+        for event, payload in sse.iter_events(response):
+            if event == "token":
+                if not in_tokens:
+                    print("\n✍️  Refiner: ", end="")
+                    in_tokens = True
+                print(payload.get("text", ""), end="", flush=True)
+                continue
+            if in_tokens:
+                print()
+                in_tokens = False
+            if event == "trace":
+                steps += 1
+                print_step(steps, payload)
+            elif event == "result":
+                data = payload
+
+    print("\n✅ Final Answer:\n")
+    print(data.get("answer", "[No answer returned]"))
+
+def follow_job(jobs_url, job_id):
+    # Replays the job's events from the last one seen, reconnecting if the stream drops
+    print(f"\n🧾 Job {job_id} (reconnect with: python mcp_client.py {job_id})")
+    seen = 0
+    steps = 0
+    status = None
+    while status is None:
+        try:
+            with http_client.get(
+                f"{jobs_url}/{job_id}/events", params={"after": seen}, stream=True, timeout=60
+            ) as response:
+                if response.status_code == 404:
+                    print(f"❌ Job {job_id} not found, it may have expired.")
+                    return
+                response.raise_for_status()
+                for event, payload in sse.iter_events(response):
+                    seen = payload.get("seq", seen)
+                    if event == "trace":
+                        steps += 1
+                        print_step(steps, payload)
+                    elif event == "status":
+                        status = payload.get("status")
+        except Exception as e:
+            print(f"⚠️ Lost the job stream ({e}), reconnecting...")
+            time.sleep(2)
+
+    job = http_client.get(f"{jobs_url}/{job_id}", timeout=30).json()
+    data = job.get("result") or {}
+    print(f"\n✅ Job {status}. Final Answer:\n")
+    print(data.get("answer", "[No answer returned]"))
+
+def run_job(jobs_url, question, intent):
+    job = http_client.post(
+        jobs_url,
+        json={"input": question, "context": {}, "intent": intent},
+        timeout=30
+    ).json()
+    follow_job(jobs_url, job["job_id"])
 
 def main():
-    SERVER_URL = resolve_entrypoint()
-    if not SERVER_URL:
+    endpoints = resolve_entrypoint()
+    SERVER_URL = endpoints.get("ask")
+    STREAM_URL = endpoints.get("stream")
+    JOBS_URL = endpoints.get("jobs")
+    if not SERVER_URL and not STREAM_URL and not JOBS_URL:
         print("❌ No server found from registry.")
         return
 
+    # python mcp_client.py          streams the answer live
+    # python mcp_client.py --job    submits a background job instead, which survives disconnects
+    # python mcp_client.py <job_id> resumes following a job
+    as_job = "--job" in sys.argv[1:]
+    job_ids = [arg for arg in sys.argv[1:] if arg != "--job"]
+    if JOBS_URL and job_ids:
+        follow_job(JOBS_URL, job_ids[0])
+        return
+
     question = input("🗨️  Ask a question: ") or "Give me a lesson plan on software testing"
     intent = "improve_answer"
 
+    if JOBS_URL and as_job:
+        try:
+            run_job(JOBS_URL, question, intent)
+        except Exception as e:
+            print(f"❌ Request failed: {e}")
+        return
+
+    if STREAM_URL:
+        try:
+            stream_answer(STREAM_URL, question, intent)
+        except Exception as e:
+            print(f"❌ Request failed: {e}")
+        return
+
     try:
         print("\n📡 Sending to MCP Server...")
-        response = requests.post(
+        response = http_client.post(
             SERVER_URL,
             json={"question": question, "intent": intent},
             timeout=300
@@ -40,10 +147,7 @@ def main():
         print("\n🧪 Pipeline Trace:")
         trace = data.get("pipeline_trace", [])
         for i, step in enumerate(trace):
-            print(f"\n🔧 Step {i+1} - Tool: {step.get('tool')}")
-            for k, v in step.items():
-                if k != "tool":
-                    print(f"   • {k}: {str(v)[:400]}{'...' if len(str(v)) > 400 else ''}")
+            print_step(i + 1, step)
 
     except Exception as e:
         print(f"❌ Request failed: {e}")
@@ -5,6 +5,7 @@ import requests
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
 from langchain_groq import ChatGroq
+from utils import governor
 import os
 from dotenv import load_dotenv
 
@@ -16,7 +17,8 @@ app = FastAPI()
 llm = ChatGroq(
     temperature=0,
     model_name="llama3-70b-8192",
-    groq_api_key=os.getenv("GROQ_API_KEY")
+    groq_api_key=os.getenv("GROQ_API_KEY"),
+    max_retries=0
 )
 
 class QuestionInput(BaseModel):
@@ -46,11 +48,11 @@ def invoke_tool(input: QuestionInput):
             "The following content was scraped from the web for the question:\n{question}\n\nScraped Answer:\n{answer}\n\nCritic Feedback:\n{feedback}\n\nUsing this feedback, write a clearer, more complete, and accurate educational answer:"
         )
         chain = LLMChain(llm=llm, prompt=improvement_prompt)
-        final_answer = chain.run({
+        final_answer = governor.call_sync("groq", "llama3-70b-8192", lambda: chain.run({
             "question": question,
             "answer": initial_answer,
             "feedback": critic_feedback_1
-        })
+        }))
     else:
         final_answer = initial_answer
 
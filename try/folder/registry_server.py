@@ -1,10 +1,32 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from typing import List, Dict
+from collections import deque
+from utils import metrics
+from utils.balancing import POLICIES, pick
+import asyncio
+import os
 import time
 
 app = FastAPI()
-registered_agents: Dict[str, Dict] = {}
+# tag -> instance_id -> {"card", "last_seen", "outstanding", "latency_ms"}
+registered_agents: Dict[str, Dict[str, Dict]] = {}
+
+HEARTBEAT_TTL = float(os.getenv("HEARTBEAT_TTL", "30"))
+RESOLVE_POLICY = os.getenv("RESOLVE_POLICY", "round_robin")
+
+metrics.install(app)
+metrics.register_stats("registry", lambda: {
+    "version": registry_version,
+    "tags": len(registered_agents),
+    "instances": sum(len(instances) for instances in registered_agents.values())
+})
+
+# Change log used by /watch so resolver caches can invalidate entries
+registry_epoch = str(time.time())
+registry_version = 0
+change_log = deque(maxlen=1000)
+changed = asyncio.Condition()
 
 class AgentCard(BaseModel):
     id: str
@@ -14,25 +36,143 @@ class AgentCard(BaseModel):
     tags: List[str]
     endpoints: Dict[str, str]
     auth: Dict
+    instance_id: str = ""
+
+class Heartbeat(BaseModel):
+    instance_id: str
+    outstanding: int = 0
+    latency_ms: float = 0.0
+
+class Deregistration(BaseModel):
+    id: str = ""
+    instance_id: str = ""
+
+def instance_key(agent: AgentCard) -> str:
+    if agent.instance_id:
+        return agent.instance_id
+    endpoint = agent.endpoints.get("a2a") or next(iter(agent.endpoints.values()), "")
+    return f"{agent.id}@{endpoint}"
+
+async def notify_change(tags):
+    global registry_version
+    if not tags:
+        return
+    async with changed:
+        for tag in tags:
+            registry_version += 1
+            change_log.append((registry_version, tag))
+        changed.notify_all()
+
+async def remove_instances(match):
+    tags = []
+    for tag, instances in list(registered_agents.items()):
+        for key in [key for key, info in instances.items() if match(key, info)]:
+            del instances[key]
+            tags.append(tag)
+        if not instances:
+            del registered_agents[tag]
+    await notify_change(sorted(set(tags)))
+    return tags
+
+async def evict_expired():
+    now = time.time()
+    tags = await remove_instances(lambda key, info: now - info["last_seen"] > HEARTBEAT_TTL)
+    if tags:
+        print(f"🧹 Evicted stale instances for tags: {tags}")
+
+async def eviction_loop():
+    while True:
+        await asyncio.sleep(HEARTBEAT_TTL / 3)
+        await evict_expired()
+
+@app.on_event("startup")
+async def start_eviction():
+    asyncio.create_task(eviction_loop())
 
 @app.post("/register")
-def register(agent: AgentCard):
+async def register(agent: AgentCard):
+    agent.instance_id = instance_key(agent)
     for tag in agent.tags:
-        registered_agents[tag] = {
+        previous = registered_agents.get(tag, {}).get(agent.instance_id, {})
+        registered_agents.setdefault(tag, {})[agent.instance_id] = {
             "card": agent.dict(),
-            "last_seen": time.time()
+            "last_seen": time.time(),
+            "outstanding": previous.get("outstanding", 0),
+            "latency_ms": previous.get("latency_ms", 0.0)
         }
-    return {"status": "registered", "tags": agent.tags}
+    await notify_change(agent.tags)
+    return {"status": "registered", "tags": agent.tags, "instance_id": agent.instance_id, "ttl": HEARTBEAT_TTL}
+
+@app.post("/heartbeat")
+def heartbeat(beat: Heartbeat):
+    found = False
+    for instances in registered_agents.values():
+        info = instances.get(beat.instance_id)
+        if info:
+            info.update(last_seen=time.time(), outstanding=beat.outstanding, latency_ms=beat.latency_ms)
+            found = True
+    if not found:
+        # Evicted or registry restarted, the agent has to register again
+        raise HTTPException(status_code=404, detail=f"Instance '{beat.instance_id}' not registered")
+    return {"status": "ok", "ttl": HEARTBEAT_TTL}
+
+@app.post("/deregister")
+async def deregister(agent: Deregistration):
+    if agent.instance_id:
+        tags = await remove_instances(lambda key, info: key == agent.instance_id)
+    else:
+        tags = await remove_instances(lambda key, info: info["card"]["id"] == agent.id)
+    return {"status": "deregistered", "tags": tags}
+
+def live_instances(tag: str):
+    now = time.time()
+    return [info for info in registered_agents.get(tag, {}).values() if now - info["last_seen"] <= HEARTBEAT_TTL]
 
 @app.get("/resolve")
-def resolve(tag: str):
-    if tag in registered_agents:
-        return registered_agents[tag]["card"]
+def resolve(tag: str, policy: str = ""):
+    policy = policy or RESOLVE_POLICY
+    if policy not in POLICIES:
+        raise HTTPException(status_code=400, detail=f"Unknown policy '{policy}', expected one of {POLICIES}")
+    chosen = pick(tag, live_instances(tag), policy)
+    if chosen:
+        return chosen["card"]
     raise HTTPException(status_code=404, detail=f"Agent with tag '{tag}' not found")
 
+@app.get("/instances")
+def list_instances(tag: str):
+    found = live_instances(tag)
+    if not found:
+        raise HTTPException(status_code=404, detail=f"Agent with tag '{tag}' not found")
+    return [
+        {"card": info["card"], "outstanding": info["outstanding"], "latency_ms": info["latency_ms"]}
+        for info in found
+    ]
+
+@app.get("/watch")
+async def watch(since: int = 0, epoch: str = "", timeout: float = 30):
+    # Long-poll until something changes after `since`, or the timeout expires
+    async with changed:
+        if epoch != registry_epoch:
+            # First watch, or the registry restarted since the caller last looked
+            return {"epoch": registry_epoch, "version": registry_version, "reset": True, "changed": []}
+        if registry_version <= since:
+            try:
+                await asyncio.wait_for(changed.wait_for(lambda: registry_version > since), timeout)
+            except asyncio.TimeoutError:
+                pass
+        if change_log and change_log[0][0] > since + 1:
+            # Caller fell behind the change log, it has to drop its whole cache
+            return {"epoch": registry_epoch, "version": registry_version, "reset": True, "changed": []}
+        tags = sorted({tag for version, tag in change_log if version > since})
+        return {"epoch": registry_epoch, "version": registry_version, "reset": False, "changed": tags}
+
 @app.get("/list")
 def list_agents():
-    return [info["card"] for info in registered_agents.values()]
+    cards = {}
+    for instances in registered_agents.values():
+        for key, info in instances.items():
+            cards[key] = info["card"]
+    return list(cards.values())
 
 @app.get("/")
 def health():
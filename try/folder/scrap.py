@@ -1,18 +1,43 @@
 from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import requests
-from bs4 import BeautifulSoup
-from serpapi import GoogleSearch
+from typing import List
 import os, json
+import asyncio
+import threading
+import time
 from dotenv import load_dotenv
+from utils import blob_store, governor, http_client, jobs, metrics, sse, wire
+from utils.fetcher import fan_out, fetch_page
+from utils.host_scheduler import get_scheduler
+from utils.page_cache import get_cache as get_page_cache
+from utils.search import asearch
+from utils.serp_cache import get_cache as get_serp_cache, normalize_query
+from utils.registration import AgentRegistration
+from utils.resolver import RegistryResolver
+from utils.aggregate import aggregate_candidates
+from utils.packing import CONTEXT_TOKENS, load_encoding, pack
+from utils.scoring import best_content, pack_candidate
+from utils.single_flight import SingleFlight
 
 
 load_dotenv()
 SERP_API_KEY = os.getenv("SERP_API_KEY")
 REGISTRY_URL = os.getenv("REGISTRY_URL", "http://localhost:9000")
+AGENT_URL = os.getenv("AGENT_URL", "https://f9cf1b13c40d.ngrok-free.app")
+# "aggregate" merges the deduplicated, BM25 ranked paragraphs of SCRAPE_BEST_OF pages,
+# "score" keeps the best scored page of those, "first"/"best" keep a single page as-is
+SCRAPE_MODE = os.getenv("SCRAPE_MODE", "aggregate")
+SCRAPE_BEST_OF = int(os.getenv("SCRAPE_BEST_OF", "3"))
+# How much of each page the scorer gets to look at
+SCRAPE_CANDIDATE_CHARS = int(os.getenv("SCRAPE_CANDIDATE_CHARS", "20000"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
 
 
 app = FastAPI()
+resolver = RegistryResolver(REGISTRY_URL)
+flights = SingleFlight()
 
 
 class A2ARequest(BaseModel):
@@ -22,139 +47,261 @@ class A2ARequest(BaseModel):
     intent: str = ""
 
 
+class BatchRequest(BaseModel):
+    questions: List[str]
+    context: dict = {}
+    intent: str = ""
+    concurrency: int = 0
+
+
 AGENT_CARD = {
     "id": "scraper-tool",
     "name": "Scraper Tool",
     "version": "1.0.0",
     "description": "Scrapes the web using SerpAPI and returns content",
-    "tags": ["scraper"],
-    "endpoints": {"a2a": "https://f9cf1b13c40d.ngrok-free.app/a2a"},
+    "tags": ["scraper", "entry"],
+    "endpoints": {
+        "a2a": f"{AGENT_URL}/a2a",
+        "stream": f"{AGENT_URL}/a2a/stream",
+        "batch": f"{AGENT_URL}/a2a/batch",
+        "jobs": f"{AGENT_URL}/jobs"
+    },
     "auth": {"type": "none"}
 }
 
-try:
-    res = requests.post(f"{REGISTRY_URL}/register", json=AGENT_CARD)
-    print("✅ Registered with registry:", res.json())
-except Exception as e:
-    print("❌ Failed to register with registry:", e)
+registration = AgentRegistration(REGISTRY_URL, AGENT_CARD)
+registration.install(app)
+metrics.install(app)
+wire.install(app)
+blob_store.install(app)
+metrics.register_stats("blob", lambda: blob_store.get_store().info())
+metrics.register_stats("serp", lambda: get_serp_cache().info())
+metrics.register_stats("page", lambda: get_page_cache().info())
+metrics.register_stats("resolver", lambda: resolver.stats)
+metrics.register_stats("single_flight", flights.info)
+metrics.register_stats("governor", governor.info)
+metrics.register_stats("hosts", lambda: get_scheduler().info())
+metrics.register_stats("jobs", lambda: job_queue.info())
+
+@app.on_event("startup")
+def warm_up():
+    # Load the tokenizer that packs scraped content off the request path while registration runs
+    threading.Thread(target=load_encoding, name="tokenizer-warmup", daemon=True).start()
 
 @app.get("/.well-known/agent.json")
 def agent_card():
     return AGENT_CARD
 
-def resolve_agent(tag):
-    try:
-        res = requests.get(f"{REGISTRY_URL}/resolve?tag={tag}")
-        return res.json().get("endpoints", {}).get("a2a")
-    except:
-        return None
-
-
-BLOCKED_DOMAINS = ["quora.com", "linkedin.com", "facebook.com"]
 
 def is_readable(text: str) -> bool:
     return len(text.split()) >= 30
 
+def extract_content(url: str, text: str) -> str:
+    if is_readable(text):
+        return f"Source: {url}\n\n{pack(text, CONTEXT_TOKENS)}"
+    return None
+
+def extract_candidate(url: str, text: str) -> str:
+    if is_readable(text):
+        return pack_candidate(url, text.blocks)
+    return None
+
 def scrape_page(url: str) -> str:
     try:
-        headers = {"User-Agent": "Mozilla/5.0"}
-        resp = requests.get(url, headers=headers, timeout=10)
-        soup = BeautifulSoup(resp.text, "html.parser")
-        for tag in soup(["script", "style", "nav", "footer", "header", "noscript"]):
-            tag.decompose()
-        content_blocks = soup.find_all(["p", "li", "h2"])
-        texts = [tag.get_text(strip=True) for tag in content_blocks if tag.get_text(strip=True)]
-        combined = "\n".join(texts)
-        if is_readable(combined):
-            return f"Source: {url}\n\n{combined[:5000]}"
+        return http_client.run_sync(fetch_page(url, extract_content))
     except Exception as e:
         print(f"❌ Failed to scrape {url}: {e}")
     return None
 
-def scrape_web(query: str) -> str:
+async def scrape_web_async(query: str) -> str:
     if not SERP_API_KEY:
         return "⚠️ SERP_API_KEY not set."
     try:
-        search = GoogleSearch({"q": query, "api_key": SERP_API_KEY, "num": 10})
-        results = search.get_dict()
+        results = await asearch({"q": query, "api_key": SERP_API_KEY, "num": 10})
         links = [r.get("link", "") for r in results.get("organic_results", [])]
-        for url in links:
-            if any(domain in url for domain in BLOCKED_DOMAINS):
-                continue
-            result = scrape_page(url)
-            if result:
-                return result
+        links = [url for url in links if url]
+        if SCRAPE_MODE in ("aggregate", "score"):
+            candidates = await fan_out(
+                links, extract_candidate, mode="all", best_of=SCRAPE_BEST_OF,
+                options={"max_chars": SCRAPE_CANDIDATE_CHARS}
+            )
+            rank = aggregate_candidates if SCRAPE_MODE == "aggregate" else best_content
+            result = rank(candidates, query)
+        else:
+            result = await fan_out(links, extract_content, mode=SCRAPE_MODE, best_of=SCRAPE_BEST_OF)
+        if result:
+            return result
         return "❌ No usable educational content found."
     except Exception as e:
         return f"❌ Search/scraping failed: {e}"
 
+def scrape_web(query: str) -> str:
+    return http_client.run_sync(scrape_web_async(query))
 
-@app.post("/a2a")
-def a2a_scraper(req: A2ARequest):
+
+async def scrape_and_critique(req: A2ARequest, stream=False):
+    # Yields ("trace", step) and relayed critic events as they happen, ("result", response) last
     question = req.input
     trace = req.pipeline_trace or []
 
     print(f"🔍 Scraping for: {question}")
-    scraped = scrape_web(question)
+    started = time.time()
+    scraped = await scrape_web_async(question)
 
     status = "ok" if scraped and "Source:" in scraped else "error"
-    trace.append({
+    step = metrics.timed({
         "tool": "scraper",
         "status": status,
         "phase": "scraped",
         "content": scraped
-    })
+    }, started)
+    trace.append(step)
+    # The scraped text already travels as the answer, the trace only keeps a reference to it
+    trace = blob_store.pack_trace(trace, AGENT_URL)
+    yield "trace", trace[-1]
 
     if status == "error":
-        return {
+        yield "result", {
             "status": "error",
             "phase": "scraped",
             "answer": scraped,
             "pipeline_trace": trace,
             "note": "No valid content found."
         }
+        return
 
     # Forward to critic
-    critic_url = resolve_agent("critic")
-    if not critic_url:
-        print("⚠️ No critic found, returning scraped content as-is")
-        return {
-            "status": "ok",
-            "phase": "scraped",
-            "answer": scraped,
-            "context": {"answer": scraped, "phase": "scraped"},
-            "pipeline_trace": trace,
-            "note": "No critic found"
-        }
-
-    try:
-        print(f"➡️ Forwarding to Critic: {critic_url}")
-        res = requests.post(
-            url=critic_url,
-            json={
-                "input": question,
-                "context": {
-                    "answer": scraped,
-                    "phase": "initial"
-                },
+    async with resolver.ause("critic", "stream" if stream else "a2a") as critic_url:
+        if not critic_url:
+            print("⚠️ No critic found, returning scraped content as-is")
+            yield "result", {
+                "status": "ok",
+                "phase": "scraped",
+                "answer": scraped,
+                "context": {"answer": scraped, "phase": "scraped"},
                 "pipeline_trace": trace,
-                "intent": "evaluate_scraped_content"
+                "note": "No critic found"
+            }
+            return
+
+        payload = {
+            "input": question,
+            "context": {
+                "answer": scraped,
+                "phase": "initial"
             },
-            timeout=60
-        )
-        return res.json()
-    except Exception as e:
-        print(f"❌ Error calling critic: {e}")
-        return {
-            "status": "error",
-            "phase": "scraped",
-            "answer": scraped,
-            "context": {"answer": scraped, "phase": "scraped"},
             "pipeline_trace": trace,
-            "error": f"Failed to contact critic: {e}"
+            "intent": "evaluate_scraped_content"
         }
+        try:
+            print(f"➡️ Forwarding to Critic: {critic_url}")
+            if stream:
+                async for event, data in sse.relay(critic_url, payload, timeout=60):
+                    yield event, data
+            else:
+                res = await http_client.get_async_client().post(url=critic_url, timeout=60, **wire.json_body(payload))
+                yield "result", res.json()
+        except Exception as e:
+            print(f"❌ Error calling critic: {e}")
+            yield "result", {
+                "status": "error",
+                "phase": "scraped",
+                "answer": scraped,
+                "context": {"answer": scraped, "phase": "scraped"},
+                "pipeline_trace": trace,
+                "error": f"Failed to contact critic: {e}"
+            }
+
+
+def coalesced(req: A2ARequest):
+    # Concurrent requests for the same normalized question share one pipeline run (and its trace).
+    # The shared run always streams so stream and plain callers can attach to the same one.
+    if req.pipeline_trace:
+        # Callers continuing their own trace get their own run
+        return scrape_and_critique(req, stream=True)
+    return flights.run(normalize_query(req.input), lambda: scrape_and_critique(req, stream=True))
+
+
+@app.post("/a2a")
+async def a2a_scraper(req: A2ARequest):
+    result = None
+    async for event, data in coalesced(req):
+        if event == "result":
+            result = data
+    return result
+
+
+@app.post("/a2a/stream")
+async def a2a_scraper_stream(req: A2ARequest):
+    return StreamingResponse(sse.encode(coalesced(req)), media_type="text/event-stream", headers=sse.HEADERS)
+
+
+async def run_batch(req: BatchRequest):
+    # Identical (normalized) questions run once; each result is streamed as soon as it finishes
+    groups = {}
+    for index, question in enumerate(req.questions):
+        groups.setdefault(normalize_query(question), []).append(index)
+
+    concurrency = max(1, min(req.concurrency or BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    sem = asyncio.Semaphore(concurrency)
+
+    async def run_one(indices):
+        question = req.questions[indices[0]]
+        async with sem:
+            result = None
+            try:
+                single = A2ARequest(input=question, context=dict(req.context), intent=req.intent)
+                async for event, data in coalesced(single):
+                    if event == "result":
+                        result = data
+            except Exception as e:
+                print(f"❌ Batch item failed for '{question}': {e}")
+                result = {"status": "error", "error": str(e), "pipeline_trace": []}
+        return indices, question, result
+
+    print(f"📦 Batch of {len(req.questions)} questions, {len(groups)} unique, concurrency {concurrency}")
+    yield "batch", {"questions": len(req.questions), "unique": len(groups), "concurrency": concurrency}
+
+    tasks = [asyncio.create_task(run_one(indices)) for indices in groups.values()]
+    completed = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            indices, question, result = await next_done
+            completed += 1
+            yield "result", {"indices": indices, "question": question, "response": result}
+    finally:
+        # Client went away: stop the work that is still queued or running
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    yield "done", {"completed": completed, "unique": len(groups)}
+
+
+@app.post("/a2a/batch")
+async def a2a_batch(req: BatchRequest):
+    return StreamingResponse(sse.encode(run_batch(req)), media_type="text/event-stream", headers=sse.HEADERS)
+
+
+# Submit/poll/cancel in front of the pipeline, so long runs do not hold a connection open
+job_queue = jobs.JobQueue(lambda request: coalesced(A2ARequest(**request)))
+jobs.install(app, job_queue)
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(req: A2ARequest):
+    return job_queue.store.get(job_queue.submit(req.model_dump()))
 
 
 @app.get("/")
 def health_check():
-    return {"status": "Scraper tool (A2A-enabled) is running"}
+    return {
+        "status": "Scraper tool (A2A-enabled) is running",
+        "registered": registration.registered.is_set(),
+        "pool": http_client.pool_stats(),
+        "serp_cache": get_serp_cache().info(),
+        "page_cache": get_page_cache().info(),
+        "blob_store": blob_store.get_store().info(),
+        "single_flight": flights.info(),
+        "jobs": job_queue.info()
+    }
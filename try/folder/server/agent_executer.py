@@ -1,9 +1,10 @@
-import asyncio
 import os
+import threading
 from langchain.agents import initialize_agent, AgentType
 from langchain_groq import ChatGroq
-from server.tools import MCPTool
-from utils.logger import save_to_pdf, sanitize_text
+from server.tools import MCPTool, request_scope
+from utils import governor, report
+from utils.report import sanitize_text
 from dotenv import load_dotenv
 import os
 
@@ -11,34 +12,80 @@ load_dotenv()
 
 
 
-llm = ChatGroq(
+class GovernedChatGroq(ChatGroq):
+    # Each LLM call takes its own governor slot, so the agent's tool calls never hold one
+    # and a 429 only retries the call that got it
+    def _generate(self, *args, **kwargs):
+        return governor.call_sync(
+            "groq", self.model_name, lambda: super(GovernedChatGroq, self)._generate(*args, **kwargs)
+        )
+
+    async def _agenerate(self, *args, **kwargs):
+        return await governor.call(
+            "groq", self.model_name, lambda: super(GovernedChatGroq, self)._agenerate(*args, **kwargs)
+        )
+
+llm = GovernedChatGroq(
     temperature=0,
     model_name="llama3-8b-8192",
     api_key=os.getenv("GROQ_API_KEY"),
+    max_retries=0
 )
 
-async def get_agent_response(reference_site, query):
+def log_report(rendering):
     try:
-        tool = MCPTool(
-            name="custom_search",
-            description=f"Extract content from {reference_site}",
-            serp_api_key=os.getenv("SERP_API_KEY"),
-            reference_site=reference_site
-        )
+        print(f"[INFO] Report written to {rendering.result()}")
+    except Exception as e:
+        print(f"[⚠️] Report rendering failed: {e}")
 
-        agent = initialize_agent(
-            tools=[tool],
-            llm=llm,
-            agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-            verbose=True,
-            max_iterations=1
-        )
+# (tool, agent) per reference site; both are stateless between requests
+_agents = {}
+_agents_lock = threading.Lock()
+
+def get_agent(reference_site):
+    entry = _agents.get(reference_site)
+    if entry is None:
+        with _agents_lock:
+            entry = _agents.get(reference_site)
+            if entry is None:
+                tool = MCPTool(
+                    name="custom_search",
+                    description=f"Extract content from {reference_site}",
+                    serp_api_key=os.getenv("SERP_API_KEY"),
+                    reference_site=reference_site
+                )
 
-        print("[INFO] Running agent...")
-        final_answer = agent.run(query)
+                agent = initialize_agent(
+                    tools=[tool],
+                    llm=llm,
+                    agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+                    verbose=True,
+                    max_iterations=1,
+                    # The tool output the agent saw doubles as the full scraped content
+                    return_intermediate_steps=True
+                )
+                entry = _agents[reference_site] = tool, agent
+    return entry
 
-        print("[INFO] Running MCPTool for full content...")
-        scraped_content = tool._run(query)
+async def get_agent_response(reference_site, query):
+    try:
+        tool, agent = get_agent(reference_site)
+
+        with request_scope():
+            print("[INFO] Running agent...")
+            result = await agent.ainvoke({"input": query})
+            final_answer = result["output"]
+
+            # Reuse what the agent's own tool call fetched, whatever query it phrased
+            observations = [
+                observation for action, observation in result.get("intermediate_steps", [])
+                if getattr(action, "tool", None) == tool.name and isinstance(observation, str)
+            ]
+            if observations:
+                scraped_content = observations[-1]
+            else:
+                print("[INFO] Running MCPTool for full content...")
+                scraped_content = await tool._arun(query)
 
         combined_output = (
             f"🧠 Final Agent Answer:\n{final_answer}\n\n"
@@ -46,7 +93,13 @@ async def get_agent_response(reference_site, query):
         )
 
         sanitized = sanitize_text(combined_output)
-        save_to_pdf(sanitized)
+
+        # Rendered on the report pool so the PDF never delays the answer
+        rendering = report.submit({
+            "Final Agent Answer": final_answer,
+            "Full Scraped Content": scraped_content
+        }, name=query)
+        rendering.add_done_callback(log_report)
 
         return sanitized
 
@@ -1,69 +1,57 @@
-import requests
-from bs4 import BeautifulSoup
-from serpapi import GoogleSearch
 import os
 from dotenv import load_dotenv
+from utils import http_client
+from utils.fetcher import fan_out, fetch_page
+from utils.packing import CONTEXT_TOKENS, pack
+from utils.search import asearch
 load_dotenv()
 SERP_API_KEY = os.getenv("SERP_API_KEY")
-
-# Block domains that typically prevent scraping
-BLOCKED_DOMAINS = ["quora.com", "medium.com", "linkedin.com", "facebook.com"]
+SCRAPE_MODE = os.getenv("SCRAPE_MODE", "first")
+SCRAPE_BEST_OF = int(os.getenv("SCRAPE_BEST_OF", "3"))
 
 def is_readable(text: str) -> bool:
     return len(text.split()) >= 30  
 
+def extract_content(url: str, text: str) -> str:
+    if is_readable(text):
+        return f"Source: {url}\n\n{pack(text, CONTEXT_TOKENS)}"
+    return None
+
 def scrape_page(url: str) -> str:
     try:
-        headers = {"User-Agent": "Mozilla/5.0"}
-        response = requests.get(url, headers=headers, timeout=10)
-        soup = BeautifulSoup(response.text, "html.parser")
-        
-        
-        for tag in soup(["script", "style", "nav", "footer", "header", "noscript"]):
-            tag.decompose()
-
-        
-        blocks = soup.find_all(["p", "li", "h2"])
-        texts = [tag.get_text(strip=True) for tag in blocks if tag.get_text(strip=True)]
-        combined = "\n".join(texts)
-
-        if is_readable(combined):
-            return f"Source: {url}\n\n{combined[:5000]}"
+        return http_client.run_sync(fetch_page(url, extract_content))
     except Exception as e:
         print(f"❌ Failed to scrape {url}: {e}")
     return None
 
-def scrape_web(question: str) -> str:
+async def scrape_web_async(question: str) -> str:
     if not SERP_API_KEY:
         return "⚠️ SERPAPI_API_KEY not set in environment."
 
     try:
-        
-        search = GoogleSearch({
+        results = await asearch({
             "q": question,
             "api_key": SERP_API_KEY,
             "num": 10
         })
-
-        results = search.get_dict()
         links = [r.get("link", "") for r in results.get("organic_results", [])]
 
         if not links:
             return "❌ No search results found."
 
-        
-        for url in links:
-            if any(domain in url for domain in BLOCKED_DOMAINS):
-                print(f"⛔ Skipping blocked domain: {url}")
-                continue
+        # fan_out skips hosts that keep failing, see utils/host_scheduler.py
+        candidates = [url for url in links if url]
 
-            print(f"🔍 Trying: {url}")
-            result = scrape_page(url)
-            if result:
-                print(f"✅ Successfully scraped: {url}")
-                return result
+        print(f"🔍 Fetching {len(candidates)} candidates concurrently")
+        result = await fan_out(candidates, extract_content, mode=SCRAPE_MODE, best_of=SCRAPE_BEST_OF)
+        if result:
+            print(f"✅ Successfully scraped: {result.splitlines()[0]}")
+            return result
 
         return "❌ No usable educational content found from the top sources."
-    
+
     except Exception as e:
         return f"❌ Search or scraping failed: {e}"
+
+def scrape_web(question: str) -> str:
+    return http_client.run_sync(scrape_web_async(question))
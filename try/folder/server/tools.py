@@ -1,8 +1,31 @@
+import contextvars
+from contextlib import contextmanager
+from utils import http_client
+from utils.aggregate import aggregate_candidates
+from utils.fetcher import fan_out
+from utils.scoring import pack_candidate
+from utils.search import asearch
+from utils.serp_cache import normalize_query
+from langchain.tools import BaseTool
 
+# Tool results of the request being handled, see request_scope()
+_results = contextvars.ContextVar("mcp_tool_results", default=None)
+
+
+@contextmanager
+def request_scope():
+    # Within a request, calling the tool again with the same query reuses the first result
+    token = _results.set({})
+    try:
+        yield
+    finally:
+        _results.reset(token)
+
+
+def extract_blocks(url: str, text: str) -> str:
+    # Whole pages are aggregated paragraph by paragraph, so mirrored copies are only paid for once
+    return pack_candidate(url, text.blocks) if text.blocks else None
 
-import requests
-from langchain.tools import BaseTool
-from bs4 import BeautifulSoup
 
 class MCPTool(BaseTool):
     name: str
@@ -11,6 +34,15 @@ class MCPTool(BaseTool):
     reference_site: str
 
     def _run(self, query: str) -> str:
+        return http_client.run_sync(self._arun(query))
+
+    async def _arun(self, query: str) -> str:
+        results = _results.get()
+        key = normalize_query(query)
+        if results is not None and key in results:
+            print(f"[INFO] Reusing the {self.name} result for '{query}'")
+            return results[key]
+
         try:
             full_query = f"site:{self.reference_site} {query}"
             params = {
@@ -19,39 +51,22 @@ class MCPTool(BaseTool):
                 "engine": "google",
                 "num": "3"
             }
-            response = requests.get("https://serpapi.com/search", params=params)
-            data = response.json()
+            data = await asearch(params)
 
             if "organic_results" not in data:
                 return "[❌] No search results found."
 
-            results = data["organic_results"]
-            extracted_text = ""
-
-            for item in results:
-                link = item.get("link", "")
-                try:
-                    page = requests.get(link, timeout=10)
-                    soup = BeautifulSoup(page.text, "html.parser")
-
-                    
-                    headings = [h.get_text() for h in soup.find_all(["h1", "h2", "h3"])]
-                    paragraphs = [p.get_text() for p in soup.find_all("p")]
-
-                    content = "\n".join(headings + paragraphs)
-
-                    if len(content) > 4000:
-                        content = content[:4000] + "\n...[truncated]"
-
-                    extracted_text += f"\n🔗 {link}\n{content}\n\n"
-
-                except Exception as e:
-                    extracted_text += f"[⚠️] Failed to scrape {link}: {str(e)}\n"
+            links = [item.get("link", "") for item in data["organic_results"]]
+            links = [link for link in links if link]
+            # All result pages are fetched concurrently
+            candidates = await fan_out(links, extract_blocks, mode="all", best_of=len(links))
 
-            return extracted_text.strip() if extracted_text else "[❌] No content extracted."
+            context = aggregate_candidates(candidates, query)
+            result = context if context else "[❌] No content extracted."
 
         except Exception as e:
             return f"[❌] Error: {str(e)}"
 
-    def _arun(self, query: str):
-        raise NotImplementedError("Async not supported for MCPTool")
+        if results is not None:
+            results[key] = result
+        return result
@@ -0,0 +1,41 @@
+from utils.aggregate import dedupe, shingles
+
+
+def jaccard(a: str, b: str) -> float:
+    x, y = shingles(a), shingles(b)
+    return len(x & y) / len(x | y)
+
+
+def test_dedupe_drops_near_duplicates_across_pages():
+    text = "Unit tests check a single function in isolation from the rest of the system."
+    paragraphs = [
+        ("https://a.example/1", text),
+        ("https://b.example/2", text.replace("system.", "system!")),
+        ("https://b.example/2", text.replace("single", "one")),
+    ]
+    assert dedupe(paragraphs) == paragraphs[:1]
+
+
+def test_dedupe_keeps_distinct_template_paragraphs():
+    first = "Step one of the guide: install the package with pip and check the version."
+    second = "Step two of the guide: write a failing test first and then make it pass."
+    assert jaccard(first, second) < 0.5
+    paragraphs = [("https://a.example", first), ("https://a.example", second)]
+    assert dedupe(paragraphs) == paragraphs
+
+
+def test_dedupe_keeps_order_of_first_occurrences():
+    paragraphs = [(f"https://site.example/{i}", f"Paragraph {i} talks about topic {i} in enough words here.")
+                  for i in range(5)]
+    assert dedupe(paragraphs + paragraphs) == paragraphs
+
+
+def test_aggregate_candidates_falls_back_to_all_blocks_of_list_pages():
+    from utils.aggregate import aggregate_candidates
+    from utils.scoring import pack_candidate
+
+    items = [("li", f"pytest fixture {i}", 0, 1) for i in range(40)]
+    result = aggregate_candidates([pack_candidate("https://docs.example/list", items)], "pytest fixtures")
+    assert result is not None
+    assert result.startswith("Source: [1] https://docs.example/list")
+    assert "pytest fixture 0" in result
@@ -0,0 +1,60 @@
+import asyncio
+
+import httpx
+import pytest
+
+from utils import fetcher
+from utils.host_scheduler import HostScheduler
+from utils.page_cache import PageCache
+
+WORDS = " ".join(["word"] * 60)
+
+
+def extract(url, text):
+    return text
+
+
+async def handler(request):
+    if request.url.host == "blocked.example":
+        return httpx.Response(403, html=f"<p>Access denied {WORDS}</p>")
+    await asyncio.sleep(0.2)
+    return httpx.Response(200, html=f"<p>The real answer {WORDS}</p>")
+
+
+@pytest.fixture
+def scheduler(tmp_path, monkeypatch):
+    scheduler = HostScheduler("")
+    monkeypatch.setattr(fetcher, "get_scheduler", lambda: scheduler)
+    monkeypatch.setattr(fetcher, "get_page_cache", lambda: PageCache(str(tmp_path / "pages.sqlite")))
+    monkeypatch.setattr(fetcher, "get_async_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return scheduler
+
+
+def test_error_pages_are_not_candidates(scheduler):
+    urls = ["https://blocked.example/", "https://slow.example/"]
+    content = asyncio.run(fetcher.fan_out(urls, extract, mode="first"))
+    assert content.startswith("The real answer")
+    assert scheduler.info()["failures"] == 1
+
+
+def test_no_cache_pages_are_revalidated_before_they_are_served(tmp_path, monkeypatch):
+    sent = []
+    headers = {"etag": '"v1"', "cache-control": "no-cache"}
+
+    async def origin(request):
+        sent.append(request.headers.get("if-none-match"))
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304, headers=headers)
+        return httpx.Response(200, html=f"<p>Version one {WORDS}</p>", headers=headers)
+
+    cache = PageCache(str(tmp_path / "pages.sqlite"))
+    monkeypatch.setattr(fetcher, "get_scheduler", lambda: HostScheduler(""))
+    monkeypatch.setattr(fetcher, "get_page_cache", lambda: cache)
+    client = httpx.AsyncClient(transport=httpx.MockTransport(origin))
+
+    first = asyncio.run(fetcher.fetch_page("https://origin.example/", extract, client))
+    second = asyncio.run(fetcher.fetch_page("https://origin.example/", extract, client))
+    assert first == second and first.startswith("Version one")
+    # The second call waited for the origin's 304 instead of serving the stale copy
+    assert sent == [None, '"v1"']
+    assert cache.stats["stale_hits"] == 0 and cache.stats["revalidated"] == 1
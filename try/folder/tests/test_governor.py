@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from utils import governor
+
+
+def status_error(status, retry_after=None):
+    headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+    request = httpx.Request("POST", "https://llm.example/v1/chat")
+    response = httpx.Response(status, headers=headers, request=request)
+    return httpx.HTTPStatusError(f"{status}", request=request, response=response)
+
+
+@pytest.fixture
+def limits(tmp_path, monkeypatch):
+    monkeypatch.setattr(governor, "GOVERNOR_LIMITS", {"test": {"rate": 100.0, "burst": 10, "concurrency": 2}})
+    monkeypatch.setattr(governor, "GOVERNOR_BACKOFF_INITIAL", 0.01)
+    monkeypatch.setattr(governor, "GOVERNOR_MAX_RETRIES", 3)
+    monkeypatch.setattr(governor, "_limits", {})
+    monkeypatch.setattr(governor, "get_db", lambda: governor._open(str(tmp_path / "governor.sqlite")))
+
+
+def test_429_honours_retry_after_and_pauses_the_provider(limits):
+    attempts = []
+
+    async def fn():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise status_error(429, retry_after=0.2)
+        return "ok"
+
+    assert asyncio.run(governor.call("test", "", fn)) == "ok"
+    assert len(attempts) == 2
+    assert attempts[1] - attempts[0] >= 0.2
+    limit = governor.limits_for("test")[0]
+    assert limit.stats["throttled"] == 1
+    assert governor.info()["test.active"] == 0
+    # Everyone else waits out the pause too
+    assert limit.paused_until > 0
+
+
+def test_retries_give_up_after_the_limit(limits):
+    attempts = []
+
+    def fn():
+        attempts.append(1)
+        raise status_error(503)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        governor.call_sync("test", "", fn)
+    assert len(attempts) == governor.GOVERNOR_MAX_RETRIES + 1
+    assert governor.info()["test.active"] == 0
+
+
+def test_client_errors_are_not_retried(limits):
+    attempts = []
+
+    def fn():
+        attempts.append(1)
+        raise status_error(400)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        governor.call_sync("test", "", fn)
+    assert attempts == [1]
+
+
+def test_processes_share_one_bucket_and_its_pauses(tmp_path):
+    # Two agents on the same API key: separate connections to one governor file
+    path = str(tmp_path / "governor.sqlite")
+    critic = governor.Limit("groq:shared", 1.0, 2, 4, governor._open(path))
+    refiner = governor.Limit("groq:shared", 1.0, 2, 4, governor._open(path))
+    assert critic.reserve() == 0
+    assert refiner.reserve() == 0
+    assert 0.9 < critic.reserve() <= 1.0
+    refiner.pause(5)
+    assert critic.reserve() > 4
@@ -0,0 +1,25 @@
+from utils.host_scheduler import HOST_MAX_FAILURES, HostScheduler
+
+
+def test_failed_fetches_put_a_host_on_cooldown(tmp_path):
+    scheduler = HostScheduler(str(tmp_path / "hosts.sqlite"))
+    for _ in range(HOST_MAX_FAILURES):
+        scheduler.record("https://down.example/a", 10.0, ok=False, readable=False)
+    assert scheduler.plan(["https://down.example/b", "https://up.example/"]) == ["https://up.example/"]
+    # Statistics survive a restart
+    assert HostScheduler(str(tmp_path / "hosts.sqlite")).plan(["https://down.example/c"]) == []
+
+
+def test_unreadable_pages_deprioritize_without_cooldown(tmp_path):
+    scheduler = HostScheduler(str(tmp_path / "hosts.sqlite"))
+    for _ in range(HOST_MAX_FAILURES * 3):
+        scheduler.record("https://thin.example/a", 0.2, ok=True, readable=False)
+    urls = ["https://thin.example/b", "https://new.example/"]
+    assert scheduler.plan(urls) == ["https://new.example/", "https://thin.example/b"]
+
+
+def test_denylisted_hosts_are_skipped():
+    scheduler = HostScheduler("")
+    assert scheduler.plan(["https://www.quora.com/q", "https://blog.medium.com/p", "https://ok.example/"]) == [
+        "https://ok.example/"
+    ]
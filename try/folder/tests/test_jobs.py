@@ -0,0 +1,103 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from utils import jobs
+from utils.single_flight import SingleFlight
+
+
+async def pipeline(request):
+    yield "step", {"tool": "scraper"}
+    yield "token", {"text": "live only"}
+    if request.get("slow"):
+        await asyncio.sleep(30)
+    yield "result", {"status": "success", "answer": request["query"].upper()}
+
+
+def serve(queue):
+    app = FastAPI()
+    jobs.install(app, queue)
+
+    @app.post("/jobs")
+    def submit(request: dict):
+        return queue.store.get(queue.submit(request))
+
+    return app
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_POLL", 0.02)
+    queue = jobs.JobQueue(pipeline, jobs.JobStore(str(tmp_path / "jobs.sqlite")), workers=1)
+    with TestClient(serve(queue)) as client:
+        yield client
+
+
+def wait_for(client, job_id, statuses, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} stayed {job['status']}")
+
+
+def test_submit_and_poll(client):
+    job = client.post("/jobs", json={"query": "hello"}).json()
+    assert job["status"] == "queued"
+    done = wait_for(client, job["job_id"], jobs.FINISHED)
+    assert done["status"] == "done"
+    assert done["result"]["answer"] == "HELLO"
+    # Token events are not stored
+    assert done["events"] == 2
+
+
+def test_events_replay_after_seq(client):
+    job_id = client.post("/jobs", json={"query": "hello"}).json()["job_id"]
+    wait_for(client, job_id, jobs.FINISHED)
+    body = client.get(f"/jobs/{job_id}/events", params={"after": 1}).text
+    assert "event: step" not in body
+    assert "event: result" in body
+    assert "event: status" in body
+
+
+def test_cancel_running_job(client):
+    job_id = client.post("/jobs", json={"query": "hello", "slow": True}).json()["job_id"]
+    wait_for(client, job_id, ["running"])
+    assert client.delete(f"/jobs/{job_id}").json()["status"] == "cancelled"
+    assert wait_for(client, job_id, jobs.FINISHED)["status"] == "cancelled"
+
+
+def test_unknown_job_is_404(client):
+    assert client.get("/jobs/missing").status_code == 404
+    assert client.delete("/jobs/missing").status_code == 404
+
+
+def test_cancel_stops_the_coalesced_pipeline(tmp_path, monkeypatch):
+    # Like the scraper: jobs follow a single-flight execution that runs in its own task
+    monkeypatch.setattr(jobs, "JOB_POLL", 0.02)
+    reached = []
+
+    async def slow(request):
+        yield "step", {"tool": "scraper"}
+        await asyncio.sleep(0.5)
+        reached.append("critic")
+        yield "result", {"status": "success", "answer": "late"}
+
+    flights = SingleFlight(str(tmp_path / "flights.sqlite"))
+    queue = jobs.JobQueue(
+        lambda request: flights.run(request["query"], lambda: slow(request)),
+        jobs.JobStore(str(tmp_path / "jobs.sqlite")), workers=1
+    )
+    with TestClient(serve(queue)) as client:
+        job_id = client.post("/jobs", json={"query": "hello"}).json()["job_id"]
+        wait_for(client, job_id, ["running"])
+        client.delete(f"/jobs/{job_id}")
+        time.sleep(0.8)
+    assert reached == []
+    assert flights.info()["abandoned"] == 1
+    assert flights.info()["in_flight"] == 0
@@ -0,0 +1,35 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from utils import metrics
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_streamed_responses_are_tracked_until_the_last_chunk():
+    app = FastAPI()
+    metrics.install(app)
+    seen_in_flight = []
+
+    async def body():
+        yield b"first\n"
+        await asyncio.sleep(0.2)
+        seen_in_flight.append(sample("agent_requests_in_flight", path="/stream-test"))
+        yield b"last\n"
+
+    @app.get("/stream-test")
+    def stream():
+        return StreamingResponse(body())
+
+    before = sample("agent_request_seconds_sum", method="GET", path="/stream-test", status="200")
+    with TestClient(app) as client:
+        assert client.get("/stream-test").text == "first\nlast\n"
+    assert seen_in_flight == [1.0]
+    assert sample("agent_requests_in_flight", path="/stream-test") == 0.0
+    assert sample("agent_request_seconds_sum", method="GET", path="/stream-test", status="200") - before >= 0.2
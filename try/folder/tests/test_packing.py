@@ -0,0 +1,69 @@
+import sys
+import threading
+import time
+
+from utils import packing
+from utils.packing import count_tokens, pack, sentences
+
+
+def test_sentences_join_back_into_text():
+    texts = [
+        "Use Python 3.11 or www.example.com for e.g. tests. Next sentence here!",
+        "Source: https://python.org/a\n\nFirst line.\n- item one\n- item two...\nDone?! Yes.",
+        "No terminal punctuation",
+        "",
+    ]
+    for text in texts:
+        assert "".join(sentences(text)) == text
+
+
+def test_sentences_do_not_split_inside_tokens():
+    assert sentences("Use Python 3.11 or www.example.com for e.g. tests. Next sentence here!") == [
+        "Use Python 3.11 or www.example.com for e.g.", " tests.", " Next sentence here!"
+    ]
+
+
+def test_pack_keeps_whole_sentences_within_budget():
+    text = "Install Python 3.11 from python.org and run pytest -q. " * 200
+    packed = pack(text, 50)
+    assert count_tokens(packed) <= 50
+    assert packed.startswith("Install Python 3.11 from python.org")
+    assert all(s.strip() == "Install Python 3.11 from python.org and run pytest -q." for s in sentences(packed))
+
+
+def test_pack_prefers_relevant_sentences_and_keeps_sources():
+    filler = " ".join(f"Filler sentence number {i} about nothing." for i in range(100))
+    text = f"Source: https://example.com/page\n\n{filler} Regression testing reruns old tests. {filler}"
+    packed = pack(text, 40, "what is regression testing")
+    assert packed.startswith("Source: https://example.com/page")
+    assert "Regression testing reruns old tests." in packed
+    assert count_tokens(packed) <= 40
+
+
+def test_pack_returns_short_text_unchanged():
+    assert pack("Short text.", 100) == "Short text."
+
+
+def test_slow_tokenizer_download_does_not_block_callers(monkeypatch):
+    class Encoding:
+        def encode(self, text, disallowed_special=()):
+            return text.split()
+
+    class SlowTiktoken:
+        @staticmethod
+        def get_encoding(name):
+            time.sleep(0.3)
+            return Encoding()
+
+    monkeypatch.setitem(sys.modules, "tiktoken", SlowTiktoken)
+    monkeypatch.setattr(packing, "TOKENIZER_TIMEOUT", 0.05)
+    monkeypatch.setattr(packing, "_encoding", None)
+    monkeypatch.setattr(packing, "_encoding_loaded", threading.Event())
+    monkeypatch.setattr(packing, "_loading", False)
+
+    started = time.monotonic()
+    # Estimated at 4 characters per token while the download runs
+    assert packing.count_tokens("one two three four") == 5
+    assert time.monotonic() - started < 0.2
+    packing._encoding_loaded.wait(2)
+    assert packing.count_tokens("one two three four") == 4
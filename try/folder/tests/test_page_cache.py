@@ -0,0 +1,21 @@
+from utils.page_cache import PageCache
+
+
+def test_no_store_pages_are_not_kept(tmp_path):
+    cache = PageCache(str(tmp_path / "pages.sqlite"))
+    cache.put("x", "https://a.example/", "old", {"etag": '"1"'})
+    cache.put("x", "https://a.example/", "secret", {"cache-control": "private, no-store"})
+    assert cache.get("x", "https://a.example/") is None
+    assert cache.info()["entries"] == 0
+
+
+def test_no_cache_pages_are_revalidated_before_use(tmp_path):
+    cache = PageCache(str(tmp_path / "pages.sqlite"))
+    cache.put("x", "https://a.example/", "text", {"cache-control": "no-cache", "etag": '"1"'})
+    entry = cache.get("x", "https://a.example/")
+    assert not entry.fresh and not entry.usable_stale
+    assert entry.conditional_headers() == {"If-None-Match": '"1"'}
+
+    cache.put("x", "https://b.example/", "text", {"cache-control": "max-age=60"})
+    entry = cache.get("x", "https://b.example/")
+    assert entry.fresh and entry.usable_stale
@@ -0,0 +1,11 @@
+from utils import report
+
+
+def test_batch_renders_one_document_off_the_caller(tmp_path, monkeypatch):
+    monkeypatch.setattr(report, "REPORT_DIR", str(tmp_path))
+    answers = [{"Question": f"Q{i}", "Answer": "An answer. " * 50} for i in range(3)]
+    path = report.submit_batch(answers, name="Nightly batch").result(timeout=10)
+    assert path.startswith(str(tmp_path / "nightly-batch-"))
+    pdf = open(path, "rb").read()
+    assert pdf.startswith(b"%PDF") and b"/Count 3" in pdf
+    assert not list(tmp_path.glob("*.part"))
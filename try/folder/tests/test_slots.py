@@ -0,0 +1,43 @@
+import asyncio
+
+from utils.slots import Slots
+
+
+def test_waiters_get_slots_in_arrival_order():
+    async def scenario():
+        slots = Slots(1)
+        order = []
+        await slots.enter("h")
+
+        async def waiter(name):
+            await slots.enter("h")
+            order.append(name)
+            await asyncio.sleep(0.01)
+            slots.leave("h")
+
+        first = asyncio.create_task(waiter("first"))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(waiter("second"))
+        await asyncio.sleep(0)
+        # A newcomer cannot take the slot while others are queued for it
+        slots.leave("h")
+        assert not slots.try_enter("h")
+        await asyncio.gather(first, second)
+        return order, slots.active("h"), slots.stats["queued"]
+
+    assert asyncio.run(scenario()) == (["first", "second"], 0, 2)
+
+
+def test_cancelled_waiter_passes_the_slot_on():
+    async def scenario():
+        slots = Slots(1)
+        await slots.enter()
+        gone = asyncio.create_task(slots.enter())
+        staying = asyncio.create_task(slots.enter())
+        await asyncio.sleep(0)
+        gone.cancel()
+        slots.leave()
+        await staying
+        return slots.active()
+
+    assert asyncio.run(scenario()) == 1
@@ -0,0 +1,12 @@
+from utils.verdict_cache import VerdictCache, content_hash
+
+
+def test_expired_verdicts_are_pruned_on_write(tmp_path):
+    path = str(tmp_path / "verdicts.sqlite")
+    cache = VerdictCache(path=path, ttl=60)
+    cache.put(content_hash("old"), {"score": 5})
+    cache._db.execute("UPDATE verdicts SET created = created - 120")
+    cache.put(content_hash("new"), {"score": 9})
+    keys = [row[0] for row in cache._db.execute("SELECT key FROM verdicts")]
+    assert keys == [content_hash("new")]
+    assert VerdictCache(path=path, ttl=60).get(content_hash("old")) is None
@@ -0,0 +1,95 @@
+import json
+import os
+import zlib
+from collections import Counter
+
+import numpy as np
+
+from utils.bm25 import BM25, TOKEN_RE, tokens
+from utils.packing import CONTEXT_TOKENS, count_tokens, pack
+from utils.scoring import BLOCK_MIN_SCORE, FEATURE_WEIGHTS, feature_matrix
+
+# Shorter paragraphs are menu items, captions and the like
+MIN_WORDS = int(os.getenv("AGGREGATE_MIN_WORDS", "8"))
+# Paragraphs whose shingle Jaccard similarity with a kept one reaches this are dropped
+NEAR_DUPLICATE_SIMILARITY = float(os.getenv("NEAR_DUPLICATE_SIMILARITY", "0.5"))
+SHINGLE_SIZE = 3
+
+
+def shingles(text: str) -> set:
+    # Hashed word 3-grams; paragraphs are short, so exact set overlap is cheap and MinHash would only add noise
+    words = TOKEN_RE.findall(text.lower())
+    return {zlib.crc32(" ".join(words[i:i + SHINGLE_SIZE]).encode())
+            for i in range(max(1, len(words) - SHINGLE_SIZE + 1))}
+
+
+def dedupe(paragraphs: list, similarity: float = NEAR_DUPLICATE_SIMILARITY) -> list:
+    # Keeps the first of every group of near-identical (url, text) paragraphs, in order
+    kept, sizes, index = [], [], {}
+    for paragraph in paragraphs:
+        own = shingles(paragraph[1])
+        # Shingles shared with each kept paragraph, found through an inverted index
+        shared = Counter(j for shingle in own for j in index.get(shingle, ()))
+        if any(n / (len(own) + sizes[j] - n) >= similarity for j, n in shared.items()):
+            continue
+        for shingle in own:
+            index.setdefault(shingle, []).append(len(kept))
+        kept.append(paragraph)
+        sizes.append(len(own))
+    return kept
+
+
+def aggregate(pages, question: str, max_tokens: int = CONTEXT_TOKENS, min_words: int = MIN_WORDS):
+    # `pages` is [(url, [paragraph, ...]), ...] in rank order.
+    # Returns the most relevant unique paragraphs that fit in `max_tokens`, with their sources.
+    paragraphs = [
+        (url, text) for url, texts in pages for text in texts
+        if len(text.split()) >= min_words
+    ]
+    paragraphs = dedupe(paragraphs)
+    if not paragraphs:
+        return None
+
+    scores = BM25([tokens(text) for _, text in paragraphs]).scores(tokens(question))
+    order = np.argsort(-scores, kind="stable")
+    if scores[order[0]] > 0:
+        # Paragraphs that share no term with the question are not worth their tokens
+        order = order[scores[order] > 0]
+
+    chosen, sources, used = [], [], 0
+    for i in order:
+        url, text = paragraphs[i]
+        header = 0 if url in sources else count_tokens(f"Source: [{len(sources) + 1}] {url}\n")
+        cost = count_tokens(text) + header
+        if used + cost > max_tokens:
+            if chosen:
+                continue
+            # Even the best paragraph is too long, keep its most relevant sentences
+            text = pack(text, max_tokens - header, question)
+            cost = count_tokens(text) + header
+        if url not in sources:
+            sources.append(url)
+        chosen.append(f"[{sources.index(url) + 1}] {text}")
+        used += cost
+
+    header = "\n".join(f"Source: [{n}] {url}" for n, url in enumerate(sources, 1))
+    return f"{header}\n\n" + "\n\n".join(chosen)
+
+
+def aggregate_candidates(candidates, question: str, max_tokens: int = CONTEXT_TOKENS):
+    # Same as aggregate() for scoring.pack_candidate() strings, boilerplate blocks are dropped first
+    pages = [json.loads(c) for c in candidates if c]
+    blocks = [block for page in pages for block in page["blocks"]]
+    if not blocks:
+        return None
+    keep = iter(feature_matrix(blocks, question) @ FEATURE_WEIGHTS >= BLOCK_MIN_SCORE)
+    result = aggregate(
+        [(page["url"], [block[1] for block in page["blocks"] if next(keep)]) for page in pages],
+        question, max_tokens
+    )
+    if result is None:
+        # Readable pages made of short list items fail both filters, keep all their blocks like best_content()
+        result = aggregate(
+            [(page["url"], [block[1] for block in page["blocks"]]) for page in pages], question, max_tokens, 1
+        )
+    return result
@@ -0,0 +1,34 @@
+import itertools
+import random
+from collections import defaultdict
+
+POLICIES = ("round_robin", "least_outstanding", "latency_weighted")
+
+# Assumed latency for instances that have not reported one yet
+DEFAULT_LATENCY_MS = 1000.0
+# Weight of the newest sample in the latency averages agents report and resolvers keep
+LATENCY_EWMA_ALPHA = 0.2
+
+_round_robin = defaultdict(itertools.count)
+
+
+def ewma(previous, sample: float) -> float:
+    # Exponentially weighted moving average; the first sample starts it
+    return sample if not previous else LATENCY_EWMA_ALPHA * sample + (1 - LATENCY_EWMA_ALPHA) * previous
+
+
+def pick(tag, instances, policy="round_robin"):
+    # instances: list of dicts with "card", "outstanding" and "latency_ms"
+    if not instances:
+        return None
+    instances = sorted(instances, key=lambda i: i["card"].get("instance_id", ""))
+
+    if policy == "least_outstanding":
+        lowest = min(i.get("outstanding", 0) for i in instances)
+        instances = [i for i in instances if i.get("outstanding", 0) == lowest]
+    elif policy == "latency_weighted":
+        weights = [1.0 / max(i.get("latency_ms") or DEFAULT_LATENCY_MS, 1.0) for i in instances]
+        return random.choices(instances, weights=weights)[0]
+
+    # Round robin, also used to break ties between equally loaded instances
+    return instances[next(_round_robin[tag]) % len(instances)]
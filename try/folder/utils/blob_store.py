@@ -0,0 +1,93 @@
+import hashlib
+import os
+import threading
+import time
+
+from fastapi import HTTPException
+from fastapi.responses import PlainTextResponse
+
+from utils.db import open_db, shared
+
+BLOB_STORE_PATH = os.getenv("BLOB_STORE_PATH", ".cache/blobs.sqlite")
+BLOB_STORE_MAX_ENTRIES = int(os.getenv("BLOB_STORE_MAX_ENTRIES", "20000"))
+# Trace fields shorter than this stay inline, a reference would not be much smaller
+BLOB_MIN_SIZE = int(os.getenv("BLOB_MIN_SIZE", "1024"))
+# Trace step fields that are moved into the store when large
+BLOB_FIELDS = ("content",)
+
+
+def digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class BlobStore:
+    # Content-addressed text blobs, evicted least recently used first
+    def __init__(self, path=BLOB_STORE_PATH, max_entries=BLOB_STORE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0, "stored": 0}
+        self._lock = threading.Lock()
+        self._db = open_db(path)
+        self._db.execute("CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, body TEXT, accessed REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS blobs_accessed ON blobs (accessed)")
+
+    def put(self, text: str) -> str:
+        key = digest(text)
+        with self._lock:
+            # Same content, same key: an existing row only gets its access time bumped
+            inserted = self._db.execute(
+                "INSERT OR IGNORE INTO blobs VALUES (?, ?, ?)", (key, text, time.time())
+            ).rowcount
+            if not inserted:
+                self._db.execute("UPDATE blobs SET accessed = ? WHERE digest = ?", (time.time(), key))
+                return key
+            overflow = self._db.execute("SELECT COUNT(*) FROM blobs").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._db.execute(
+                    "DELETE FROM blobs WHERE rowid IN (SELECT rowid FROM blobs ORDER BY accessed LIMIT ?)",
+                    (overflow,)
+                )
+        self.stats["stored"] += 1
+        return key
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._db.execute("SELECT body FROM blobs WHERE digest = ?", (key,)).fetchone()
+            if row:
+                self._db.execute("UPDATE blobs SET accessed = ? WHERE digest = ?", (time.time(), key))
+        self.stats["hits" if row else "misses"] += 1
+        return row[0] if row else None
+
+    def info(self) -> dict:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+        return {**self.stats, "entries": entries, "max_entries": self.max_entries}
+
+
+get_store = shared(BlobStore)
+
+
+def make_ref(text: str, base_url: str) -> dict:
+    key = get_store().put(text)
+    return {"$blob": key, "size": len(text), "url": f"{base_url}/blobs/{key}"}
+
+
+def pack_trace(trace: list, base_url: str) -> list:
+    # Large step fields become {"$blob", "size", "url"} references served from `base_url`
+    packed = []
+    for step in trace:
+        large = {
+            field: make_ref(step[field], base_url) for field in BLOB_FIELDS
+            if isinstance(step.get(field), str) and len(step[field]) >= BLOB_MIN_SIZE
+        }
+        packed.append({**step, **large} if large else step)
+    return packed
+
+
+def install(app):
+    @app.get("/blobs/{key}")
+    def read_blob(key: str):
+        text = get_store().get(key)
+        if text is None:
+            raise HTTPException(status_code=404, detail=f"Blob '{key}' not found")
+        # Content addressed, so the body never changes
+        return PlainTextResponse(text, headers={"Cache-Control": "public, max-age=31536000, immutable"})
@@ -0,0 +1,37 @@
+import re
+from collections import Counter
+
+import numpy as np
+
+BM25_K1, BM25_B = 1.5, 0.75
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from how i in is it me of on or the this to what when which who why with "
+    "give tell about explain".split()
+)
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokens(text: str) -> list:
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+class BM25:
+    # Okapi BM25 over a small in-memory corpus, scored for all documents at once
+    def __init__(self, documents: list, k1=BM25_K1, b=BM25_B):
+        self.k1, self.b = k1, b
+        self.counts = [Counter(doc) for doc in documents]
+        self.lengths = np.array([len(doc) for doc in documents], dtype=float)
+        self.avg_length = self.lengths.mean() if len(documents) else 0.0
+        self.df = Counter(term for counts in self.counts for term in counts)
+
+    def scores(self, query: list) -> np.ndarray:
+        terms = [t for t in dict.fromkeys(query) if t in self.df]
+        if not terms or not self.counts:
+            return np.zeros(len(self.counts))
+        n = len(self.counts)
+        tf = np.array([[counts[t] for t in terms] for counts in self.counts], dtype=float)
+        df = np.array([self.df[t] for t in terms], dtype=float)
+        idf = np.log1p((n - df + 0.5) / (df + 0.5))
+        norm = self.k1 * (1 - self.b + self.b * self.lengths / (self.avg_length or 1.0))
+        return (idf * tf * (self.k1 + 1) / (tf + norm[:, None])).sum(axis=1)
@@ -0,0 +1,31 @@
+import os
+import sqlite3
+import threading
+
+
+def open_db(path: str) -> sqlite3.Connection:
+    # Autocommit WAL connection shared by threads (callers serialize on their own lock) and by
+    # other worker processes using the same file, which wait on each other's writes instead of failing
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.execute("PRAGMA busy_timeout=5000")
+    return db
+
+
+def shared(factory):
+    # Returns a getter that builds `factory()` on first use, once per process
+    instance = None
+    lock = threading.Lock()
+
+    def get():
+        nonlocal instance
+        if instance is None:
+            with lock:
+                if instance is None:
+                    instance = factory()
+        return instance
+
+    return get
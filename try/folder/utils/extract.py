@@ -0,0 +1,94 @@
+import codecs
+from collections import namedtuple
+
+from lxml import etree
+
+SKIP_TAGS = {"script", "style", "nav", "footer", "header", "noscript"}
+BLOCK_TAGS = ("p", "li", "h2")
+MAX_CHARS = 5000
+
+# One kept block with the markup features the scorer needs
+Block = namedtuple("Block", "tag text link_chars elements")
+
+
+class ExtractedText(str):
+    # Plain block text, with the Block list attached for callbacks that want more than text
+    blocks = ()
+
+
+class StreamingExtractor:
+    # Incremental HTML -> text for the block tags we keep, stops once `max_chars` is filled
+    def __init__(self, tags=BLOCK_TAGS, skip=SKIP_TAGS, max_chars=MAX_CHARS, encoding="utf-8"):
+        self.tags = set(tags)
+        self.skip = set(skip)
+        self.max_chars = max_chars
+        self.blocks = []
+        self.chars = 0
+        self.done = False
+        self._skip_depth = 0
+        self._capturing = None
+        self._decoder = codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+        self._parser = etree.HTMLPullParser(events=("start", "end"))
+
+    def feed(self, chunk: bytes) -> bool:
+        # Returns True once the character budget is filled and the caller can stop reading
+        if self.done:
+            return True
+        self._parser.feed(self._decoder.decode(chunk))
+        self._drain()
+        return self.done
+
+    def close(self):
+        if not self.done:
+            self._parser.feed(self._decoder.decode(b"", final=True))
+            try:
+                self._parser.close()
+            except etree.XMLSyntaxError:
+                pass
+            self._drain()
+
+    def _drain(self):
+        for event, el in self._parser.read_events():
+            tag = el.tag if isinstance(el.tag, str) else ""
+            if event == "start":
+                if tag in self.skip:
+                    self._skip_depth += 1
+                elif tag in self.tags and not self._skip_depth and self._capturing is None:
+                    self._capturing = el
+                continue
+
+            if tag in self.skip:
+                self._skip_depth -= 1
+                # Drop skipped content but keep the text that follows it
+                tail = el.tail
+                el.clear()
+                el.tail = tail
+            elif el is self._capturing:
+                self._capturing = None
+                text = " ".join("".join(el.itertext()).split())
+                if text:
+                    link_chars = sum(len("".join(a.itertext()).strip()) for a in el.iter("a"))
+                    elements = sum(1 for _ in el.iter()) - 1
+                    self.blocks.append(Block(el.tag, text, link_chars, elements))
+                    self.chars += len(text) + 1
+                    if self.chars >= self.max_chars:
+                        self.done = True
+                        return
+            if self._capturing is None:
+                # Nothing above this element still needs its text, free the subtree
+                el.clear()
+                parent = el.getparent()
+                while el.getprevious() is not None and parent is not None:
+                    del parent[0]
+
+    def text(self) -> str:
+        extracted = ExtractedText("\n".join(block.text for block in self.blocks)[:self.max_chars])
+        extracted.blocks = tuple(self.blocks)
+        return extracted
+
+
+def extract_text(html, **kwargs) -> str:
+    extractor = StreamingExtractor(**kwargs)
+    extractor.feed(html.encode("utf-8") if isinstance(html, str) else html)
+    extractor.close()
+    return extractor.text()
@@ -0,0 +1,168 @@
+import asyncio
+import os
+import time
+import httpx
+from utils.extract import StreamingExtractor
+from utils.metrics import FETCH_LATENCY, PARSE_LATENCY
+from utils.http_client import get_async_client
+from utils.host_scheduler import get_scheduler
+from utils.page_cache import get_cache as get_page_cache
+
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "8"))
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "10"))
+FETCH_DEADLINE = float(os.getenv("FETCH_DEADLINE", "15"))
+# Stop downloading a page past this many bytes, whatever was extracted so far is kept
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", str(2 * 1024 * 1024)))
+# Downloaded bytes are handed to the parser thread in batches of about this size
+FETCH_PARSE_BATCH = int(os.getenv("FETCH_PARSE_BATCH", str(64 * 1024)))
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+# Background revalidations, kept referenced until they finish
+_revalidating = set()
+
+
+def extractor_name(extract, options=None) -> str:
+    name = f"{extract.__module__}.{extract.__qualname__}"
+    return f"{name}{sorted(options.items())}" if options else name
+
+
+async def download(client: httpx.AsyncClient, url: str, extract, options=None, entry=None):
+    # Every network fetch teaches the scheduler how the host behaves
+    scheduler = get_scheduler()
+    async with scheduler.slot(url):
+        started = time.perf_counter()
+        try:
+            status, content = await _download(client, url, extract, options, entry)
+        except Exception:
+            scheduler.record(url, time.perf_counter() - started, ok=False, readable=False)
+            raise
+        # Error pages (403 walls, 404s, 5xx) are never candidates, however readable their text
+        ok = 200 <= status < 300 or status == 304
+        scheduler.record(url, time.perf_counter() - started, ok=ok, readable=ok and bool(content))
+        return content if ok else None
+
+
+async def _download(client: httpx.AsyncClient, url: str, extract, options=None, entry=None):
+    # `extract(url, text)` gets the streamed block text and decides what to keep; returns (status, content)
+    cache = get_page_cache()
+    name = extractor_name(extract, options)
+    headers = {**HEADERS, **(entry.conditional_headers() if entry else {})}
+    started = time.perf_counter()
+    parsing = 0.0
+    async with client.stream("GET", url, headers=headers, timeout=FETCH_TIMEOUT, follow_redirects=True) as resp:
+        if resp.status_code == 304 and entry:
+            # Unchanged upstream, reuse the extract without parsing again
+            cache.touch(name, url, resp.headers)
+            FETCH_LATENCY.labels("not_modified").observe(time.perf_counter() - started)
+            return resp.status_code, entry.content
+        if not 200 <= resp.status_code < 300:
+            # Not worth downloading or parsing an error page
+            FETCH_LATENCY.labels(str(resp.status_code)).observe(time.perf_counter() - started)
+            return resp.status_code, None
+        extractor = StreamingExtractor(encoding=resp.charset_encoding, **(options or {}))
+        received = 0
+        pending = []
+        pending_bytes = 0
+        async for chunk in resp.aiter_bytes():
+            received += len(chunk)
+            pending.append(chunk)
+            pending_bytes += len(chunk)
+            last = received >= FETCH_MAX_BYTES
+            if pending_bytes < FETCH_PARSE_BATCH and not last:
+                continue
+            # Parsed on a worker thread so a large page does not stall the event loop
+            mark = time.perf_counter()
+            done = await asyncio.to_thread(extractor.feed, b"".join(pending))
+            parsing += time.perf_counter() - mark
+            pending, pending_bytes = [], 0
+            if done or last:
+                break
+        mark = time.perf_counter()
+        if pending:
+            await asyncio.to_thread(extractor.feed, b"".join(pending))
+        await asyncio.to_thread(extractor.close)
+        parsing += time.perf_counter() - mark
+    # Parsing is interleaved with the download, so fetch_seconds includes it
+    FETCH_LATENCY.labels(str(resp.status_code)).observe(time.perf_counter() - started)
+    mark = time.perf_counter()
+    content = await asyncio.to_thread(extract, url, extractor.text())
+    PARSE_LATENCY.observe(parsing + time.perf_counter() - mark)
+    if resp.status_code == 200:
+        cache.put(name, url, content, resp.headers)
+    return resp.status_code, content
+
+
+async def revalidate(client: httpx.AsyncClient, url: str, extract, options, entry):
+    try:
+        await download(client, url, extract, options, entry)
+    except Exception as e:
+        print(f"⚠️ Revalidation of {url} failed: {e}")
+
+
+async def fetch_page(url: str, extract, client: httpx.AsyncClient = None, options=None):
+    client = client or get_async_client()
+    cache = get_page_cache()
+    entry = cache.get(extractor_name(extract, options), url)
+    if entry and entry.fresh:
+        cache.stats["fresh_hits"] += 1
+        return entry.content
+    if entry and entry.usable_stale:
+        # Serve stale content now and revalidate in the background
+        cache.stats["stale_hits"] += 1
+        task = asyncio.create_task(revalidate(client, url, extract, options, entry))
+        _revalidating.add(task)
+        task.add_done_callback(_revalidating.discard)
+        return entry.content
+    cache.stats["misses"] += 1
+    return await download(client, url, extract, options, entry)
+
+
+async def fan_out(urls, extract, mode="first", best_of=3, score=len,
+                  concurrency=FETCH_CONCURRENCY, deadline=FETCH_DEADLINE, options=None):
+    # mode="first": the first readable page wins
+    # mode="best":  wait for `best_of` readable pages and keep the highest scored one
+    # mode="all":   wait for `best_of` readable pages and return all of them for the caller to rank
+    # Hosts that keep failing are skipped, weak ones are tried last
+    urls = get_scheduler().plan(urls)
+    if not urls:
+        return [] if mode == "all" else None
+
+    sem = asyncio.Semaphore(concurrency)
+    results = []
+
+    client = get_async_client()
+
+    async def worker(url):
+        async with sem:
+            try:
+                return await fetch_page(url, extract, client, options)
+            except Exception as e:
+                print(f"❌ Failed to scrape {url}: {e}")
+                return None
+
+    tasks = [asyncio.create_task(worker(url)) for url in urls]
+    try:
+        for next_done in asyncio.as_completed(tasks, timeout=deadline):
+            try:
+                result = await next_done
+            except asyncio.TimeoutError:
+                print(f"⏱️ Fetch deadline of {deadline}s reached")
+                break
+            if not result:
+                continue
+            results.append(result)
+            if mode == "first" or len(results) >= best_of:
+                break
+    finally:
+        # Cancel whatever is still in flight once we have an answer
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    if mode == "all":
+        return results
+    if not results:
+        return None
+    if mode == "first":
+        return results[0]
+    return max(results, key=score)
@@ -0,0 +1,264 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from utils.db import open_db, shared
+from utils.metrics import GOVERNOR_RETRIES, GOVERNOR_WAIT
+from utils.slots import Slots
+
+# Requests per second, burst size and concurrent calls per provider and per "provider:model".
+# Calls take a slot at every level that applies, so a model limit nests inside its provider limit.
+# Rates, bursts and 429 pauses are shared by every process using GOVERNOR_PATH, so agents calling
+# the same API key stay within one budget; concurrency is capped per process.
+DEFAULT_LIMITS = {
+    "groq": {"rate": 1.0, "burst": 10, "concurrency": 8},
+    "groq:llama3-70b-8192": {"rate": 0.5, "burst": 5, "concurrency": 4},
+    "groq:llama3-8b-8192": {"rate": 0.5, "burst": 5, "concurrency": 8},
+    "serpapi": {"rate": 2.0, "burst": 5, "concurrency": 4},
+}
+# JSON object merged over DEFAULT_LIMITS, e.g. {"groq:llama3-70b-8192": {"rate": 1, "burst": 10, "concurrency": 4}}
+GOVERNOR_LIMITS = {**DEFAULT_LIMITS, **json.loads(os.getenv("GOVERNOR_LIMITS", "{}") or "{}")}
+# Leave empty to keep the buckets per process, then each process gets the full rate on its own
+GOVERNOR_PATH = os.getenv("GOVERNOR_PATH", ".cache/governor.sqlite")
+GOVERNOR_MAX_RETRIES = int(os.getenv("GOVERNOR_MAX_RETRIES", "5"))
+GOVERNOR_BACKOFF_INITIAL = float(os.getenv("GOVERNOR_BACKOFF_INITIAL", "1"))
+GOVERNOR_BACKOFF_MAX = float(os.getenv("GOVERNOR_BACKOFF_MAX", "30"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_ERRORS = ("ConnectError", "ConnectTimeout", "ReadTimeout", "ConnectionError", "Timeout",
+                "APIConnectionError", "APITimeoutError", "RemoteProtocolError")
+
+
+def _open(path=GOVERNOR_PATH):
+    if not path:
+        return None
+    db = open_db(path)
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL, paused_until REAL)"
+    )
+    return db
+
+
+get_db = shared(_open)
+_db_lock = threading.Lock()
+
+
+class Limit:
+    # Token bucket plus a concurrency cap. Callers reserve their place in the bucket and wait for it,
+    # so excess load queues up (backpressure) instead of failing.
+    def __init__(self, key, rate, burst, concurrency, db=None):
+        self.key = key
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.time()
+        self.paused_until = 0.0
+        self.slots = Slots(concurrency)
+        self.stats = {"calls": 0, "waited": 0, "wait_seconds": 0.0, "throttled": 0}
+        self._lock = threading.Lock()
+        self._db = db
+        if db is not None:
+            with _db_lock:
+                db.execute("INSERT OR IGNORE INTO buckets VALUES (?, ?, ?, 0)", (key, self.tokens, self.updated))
+
+    @contextmanager
+    def _shared(self):
+        # Loads the bucket other processes may have drawn from and writes it back in one transaction
+        if self._db is None:
+            yield
+            return
+        with _db_lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self.tokens, self.updated, self.paused_until = self._db.execute(
+                    "SELECT tokens, updated, paused_until FROM buckets WHERE key = ?", (self.key,)
+                ).fetchone()
+                yield
+                self._db.execute(
+                    "UPDATE buckets SET tokens = ?, updated = ?, paused_until = ? WHERE key = ?",
+                    (self.tokens, self.updated, self.paused_until, self.key)
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def reserve(self) -> float:
+        # Takes a token now and returns how long the caller has to wait before using it
+        with self._lock, self._shared():
+            now = time.time()
+            self.tokens = min(self.burst, self.tokens + max(0.0, now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = max(-self.tokens / self.rate if self.tokens < 0 else 0.0, self.paused_until - now)
+            self.stats["calls"] += 1
+            if wait > 0:
+                self.stats["waited"] += 1
+                self.stats["wait_seconds"] += wait
+            return wait
+
+    def pause(self, seconds: float):
+        # The provider asked us to back off: nobody gets a token until it says we may go again
+        with self._lock, self._shared():
+            self.paused_until = max(self.paused_until, time.time() + seconds)
+            self.tokens = min(self.tokens, 0.0)
+            self.stats["throttled"] += 1
+
+    def info(self) -> dict:
+        return {**self.stats, "active": self.slots.active(), "tokens": round(self.tokens, 2)}
+
+
+_limits = {}
+_limits_lock = threading.Lock()
+
+
+def limits_for(provider: str, model: str = "") -> list:
+    keys = [provider] + ([f"{provider}:{model}"] if model else [])
+    found = []
+    with _limits_lock:
+        for key in keys:
+            config = GOVERNOR_LIMITS.get(key)
+            if config is None:
+                continue
+            if key not in _limits:
+                _limits[key] = Limit(key, config["rate"], config["burst"], config["concurrency"], get_db())
+            found.append(_limits[key])
+    return found
+
+
+def retry_after(error):
+    # Seconds to wait before retrying `error`, or None when retrying would not help
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status is None:
+        return 0.0 if type(error).__name__ in RETRY_ERRORS else None
+    if status not in RETRY_STATUSES:
+        return None
+    header = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    try:
+        return max(0.0, float(header)) if header else 0.0
+    except ValueError:
+        return 0.0
+
+
+def backoff(attempt: int) -> float:
+    # Full jitter so callers that failed together do not retry together
+    return random.uniform(0, min(GOVERNOR_BACKOFF_MAX, GOVERNOR_BACKOFF_INITIAL * 2 ** attempt))
+
+
+async def _enter(limits):
+    for limit in limits:
+        wait = limit.reserve()
+        if wait > 0:
+            GOVERNOR_WAIT.labels(limit.key).observe(wait)
+            await asyncio.sleep(wait)
+    entered = []
+    try:
+        for limit in limits:
+            await limit.slots.enter()
+            entered.append(limit)
+    except BaseException:
+        _leave(entered)
+        raise
+    return entered
+
+
+def _enter_sync(limits):
+    for limit in limits:
+        wait = limit.reserve()
+        if wait > 0:
+            GOVERNOR_WAIT.labels(limit.key).observe(wait)
+            time.sleep(wait)
+    entered = []
+    for limit in limits:
+        limit.slots.enter_sync()
+        entered.append(limit)
+    return entered
+
+
+def _leave(entered):
+    for limit in entered:
+        limit.slots.leave()
+
+
+def _after_failure(limits, error, attempt):
+    # Returns the delay before the next attempt, or None when the error should be raised
+    wait = retry_after(error)
+    if wait is None or attempt >= GOVERNOR_MAX_RETRIES:
+        return None
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status == 429:
+        for limit in limits:
+            limit.pause(max(wait, GOVERNOR_BACKOFF_INITIAL))
+    GOVERNOR_RETRIES.labels(limits[-1].key if limits else "none", str(status or type(error).__name__)).inc()
+    return max(wait, backoff(attempt))
+
+
+async def call(provider: str, model: str, fn):
+    # Runs `await fn()` under the provider/model limits, retrying throttling and transient errors
+    limits = limits_for(provider, model)
+    attempt = 0
+    while True:
+        entered = await _enter(limits)
+        try:
+            return await fn()
+        except Exception as e:
+            delay = _after_failure(limits, e, attempt)
+            if delay is None:
+                raise
+            print(f"⏳ {provider} {model} call failed ({e}), retry {attempt + 1} in {delay:.1f}s")
+        finally:
+            _leave(entered)
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+def call_sync(provider: str, model: str, fn):
+    limits = limits_for(provider, model)
+    attempt = 0
+    while True:
+        entered = _enter_sync(limits)
+        try:
+            return fn()
+        except Exception as e:
+            delay = _after_failure(limits, e, attempt)
+            if delay is None:
+                raise
+            print(f"⏳ {provider} {model} call failed ({e}), retry {attempt + 1} in {delay:.1f}s")
+        finally:
+            _leave(entered)
+        time.sleep(delay)
+        attempt += 1
+
+
+async def stream(provider: str, model: str, make_stream):
+    # Like call() for an async iterator; only failures before the first item are retried
+    limits = limits_for(provider, model)
+    attempt = 0
+    while True:
+        entered = await _enter(limits)
+        started = False
+        try:
+            async for item in make_stream():
+                started = True
+                yield item
+            return
+        except Exception as e:
+            delay = None if started else _after_failure(limits, e, attempt)
+            if delay is None:
+                raise
+            print(f"⏳ {provider} {model} stream failed ({e}), retry {attempt + 1} in {delay:.1f}s")
+        finally:
+            _leave(entered)
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+def info() -> dict:
+    # Flat for metrics.register_stats: {"groq:llama3-70b-8192.calls": 12, ...}
+    with _limits_lock:
+        return {f"{key}.{stat}": value for key, limit in _limits.items() for stat, value in limit.info().items()}
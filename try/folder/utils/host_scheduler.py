@@ -0,0 +1,127 @@
+import json
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+from utils.db import open_db, shared
+from utils.slots import Slots
+
+# Leave empty to keep host statistics in memory only
+HOST_STATS_PATH = os.getenv("HOST_STATS_PATH", ".cache/hosts.sqlite")
+# Concurrent downloads per host
+HOST_CONCURRENCY = int(os.getenv("HOST_CONCURRENCY", "2"))
+# Weight of the newest observation in the moving averages
+HOST_STATS_ALPHA = float(os.getenv("HOST_STATS_ALPHA", "0.3"))
+# A host is skipped after this many failed fetches (errors, timeouts, 4xx/5xx) in a row...
+HOST_MAX_FAILURES = int(os.getenv("HOST_MAX_FAILURES", "3"))
+# ...for this long, doubling with every further failed probe up to HOST_COOLDOWN_MAX.
+# Unreadable pages only lower a host's score: the same host may well serve readable pages for other queries.
+HOST_COOLDOWN = float(os.getenv("HOST_COOLDOWN", "60"))
+HOST_COOLDOWN_MAX = float(os.getenv("HOST_COOLDOWN_MAX", "900"))
+# Hosts scoring below this are tried after the healthy ones
+HOST_DEPRIORITIZE_SCORE = float(os.getenv("HOST_DEPRIORITIZE_SCORE", "0.3"))
+# Comma separated hosts that are never fetched. Their login walls read as content, so they would never be learned.
+HOST_DENYLIST = {
+    h.strip() for h in os.getenv("HOST_DENYLIST", "quora.com,medium.com,linkedin.com,facebook.com").split(",")
+    if h.strip()
+}
+
+# What we assume about a host we have never fetched from
+PRIOR = {"latency": 1.0, "success": 1.0, "readable": 0.7}
+
+
+def host_of(url: str) -> str:
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def denied(host: str) -> bool:
+    return any(host == d or host.endswith("." + d) for d in HOST_DENYLIST)
+
+
+class HostScheduler:
+    # Learns latency, failure rate and readability per host, skips hosts that keep failing,
+    # orders the rest healthiest first and caps concurrent downloads per host
+    def __init__(self, path=HOST_STATS_PATH, concurrency=HOST_CONCURRENCY):
+        self.stats = {"fetches": 0, "failures": 0, "skipped": 0, "deprioritized": 0}
+        self._hosts = {}
+        self._slots = Slots(concurrency)
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = open_db(path)
+            self._db.execute("CREATE TABLE IF NOT EXISTS hosts (host TEXT PRIMARY KEY, stats TEXT)")
+            for host, stats in self._db.execute("SELECT host, stats FROM hosts"):
+                self._hosts[host] = json.loads(stats)
+
+    def _host(self, host: str) -> dict:
+        return self._hosts.get(host) or {**PRIOR, "fetches": 0, "streak": 0, "skip_until": 0.0}
+
+    def score(self, host: str) -> float:
+        # Expected readable pages per second of waiting
+        h = self._host(host)
+        return h["success"] * h["readable"] / (1 + h["latency"])
+
+    def skipping(self, host: str) -> bool:
+        return denied(host) or self._host(host)["skip_until"] > time.time()
+
+    def plan(self, urls) -> list:
+        # Drops hosts that are cooling down, keeps SERP order otherwise but moves weak hosts last
+        healthy, weak = [], []
+        with self._lock:
+            for url in urls:
+                host = host_of(url)
+                if self.skipping(host):
+                    self.stats["skipped"] += 1
+                    print(f"⛔ Skipping {host}" + ("" if denied(host) else " while it keeps failing"))
+                elif self.score(host) < HOST_DEPRIORITIZE_SCORE:
+                    self.stats["deprioritized"] += 1
+                    weak.append(url)
+                else:
+                    healthy.append(url)
+        return healthy + weak
+
+    def record(self, url: str, latency: float, ok: bool, readable: bool):
+        host = host_of(url)
+        a = HOST_STATS_ALPHA
+        with self._lock:
+            h = self._host(host)
+            h["fetches"] += 1
+            h["latency"] += a * (latency - h["latency"])
+            h["success"] += a * (float(ok) - h["success"])
+            if ok:
+                h["readable"] += a * (float(readable) - h["readable"])
+                h["streak"] = 0
+                h["skip_until"] = 0.0
+            else:
+                h["streak"] += 1
+                if h["streak"] >= HOST_MAX_FAILURES:
+                    # Past the threshold every failure is a failed probe, so the cooldown keeps growing
+                    cooldown = HOST_COOLDOWN * 2 ** (h["streak"] - HOST_MAX_FAILURES)
+                    h["skip_until"] = time.time() + min(cooldown, HOST_COOLDOWN_MAX)
+            self._hosts[host] = h
+            self.stats["fetches"] += 1
+            self.stats["failures"] += not ok
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO hosts VALUES (?, ?)", (host, json.dumps(h)))
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        host = host_of(url)
+        await self._slots.enter(host)
+        try:
+            yield
+        finally:
+            self._slots.leave(host)
+
+    def info(self) -> dict:
+        now = time.time()
+        with self._lock:
+            cooling = sum(1 for h in self._hosts.values() if h["skip_until"] > now)
+        return {**self.stats, **self._slots.stats, "hosts": len(self._hosts), "cooling_down": cooling,
+                "active": self._slots.active(), "disk": self._db is not None}
+
+
+get_scheduler = shared(HostScheduler)
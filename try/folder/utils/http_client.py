@@ -0,0 +1,134 @@
+import asyncio
+import os
+import threading
+import weakref
+from collections import Counter
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+# Shared keep-alive client layer for every agent-to-agent hop and page fetch
+HTTP_POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", "32"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+HTTP_KEEPALIVE = int(os.getenv("HTTP_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+HTTP2 = os.getenv("HTTP2", "1") == "1"
+
+try:
+    import h2  # noqa: F401  (httpx only negotiates HTTP/2 when h2 is installed)
+except ImportError:
+    HTTP2 = False
+
+_lock = threading.Lock()
+_session = None
+_async_clients = weakref.WeakKeyDictionary()
+_requests_per_host = Counter()
+
+
+def _count(url):
+    _requests_per_host[urlsplit(url).netloc] += 1
+
+
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_MAXSIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def request(method, url, **kwargs) -> requests.Response:
+    kwargs.setdefault("timeout", HTTP_TIMEOUT)
+    _count(url)
+    return get_session().request(method, url, **kwargs)
+
+
+def get(url, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def get_async_client() -> httpx.AsyncClient:
+    # httpx pools are bound to the event loop that created them, so keep one per loop
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            http2=HTTP2,
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=HTTP_POOL_HOSTS * HTTP_POOL_MAXSIZE,
+                max_keepalive_connections=HTTP_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            event_hooks={"request": [_on_async_request]},
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def _on_async_request(req: httpx.Request):
+    _count(str(req.url))
+
+
+async def aclose():
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def run_sync(coro):
+    # Run a coroutine from sync code and close the pool that was bound to its loop
+    async def runner():
+        try:
+            return await coro
+        finally:
+            await aclose()
+    return asyncio.run(runner())
+
+
+def pool_stats() -> dict:
+    sync_pools = {}
+    if _session is not None:
+        for adapter in set(_session.adapters.values()):
+            for key in list(adapter.poolmanager.pools.keys()):
+                pool = adapter.poolmanager.pools.get(key)
+                if pool is None:
+                    continue
+                sync_pools[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                    "idle": sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0,
+                    "opened": pool.num_connections,
+                    "requests": pool.num_requests,
+                    "maxsize": pool.pool.maxsize if pool.pool else 0,
+                }
+
+    async_pools = {}
+    for client in list(_async_clients.values()):
+        pool = getattr(client._transport, "_pool", None)
+        for conn in getattr(pool, "connections", []):
+            origin = conn._origin
+            host = f"{origin.scheme.decode()}://{origin.host.decode()}:{origin.port}"
+            stats = async_pools.setdefault(host, {"idle": 0, "active": 0, "http2": 0})
+            stats["idle" if conn.is_idle() else "active"] += 1
+            if type(getattr(conn, "_connection", None)).__name__ == "AsyncHTTP2Connection":
+                stats["http2"] += 1
+
+    return {
+        "http2": HTTP2,
+        "pool_hosts": HTTP_POOL_HOSTS,
+        "pool_maxsize": HTTP_POOL_MAXSIZE,
+        "sync": sync_pools,
+        "async": async_pools,
+        "requests_per_host": dict(_requests_per_host),
+    }
@@ -0,0 +1,286 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from utils import sse
+from utils.db import open_db
+
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", ".cache/jobs.sqlite")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Finished jobs (and their events) can be fetched for this long
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", "3600"))
+# A running job whose worker stops renewing its lease for this long is picked up again
+JOB_LEASE = float(os.getenv("JOB_LEASE", "30"))
+JOB_POLL = float(os.getenv("JOB_POLL", "0.5"))
+
+FINISHED = ("done", "error", "cancelled")
+
+
+class JobStore:
+    # Jobs and the events they produced, shared by every worker process through SQLite
+    def __init__(self, path=JOB_STORE_PATH, retention=JOB_RETENTION):
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._db = open_db(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, status TEXT, request TEXT, result TEXT, "
+            "created REAL, updated REAL, owner TEXT, lease REAL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS job_events (job_id TEXT, seq INTEGER, event TEXT, data TEXT, "
+            "PRIMARY KEY (job_id, seq))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+
+    def submit(self, request: dict) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs VALUES (?, 'queued', ?, NULL, ?, ?, NULL, 0)", (job_id, json.dumps(request), now, now)
+            )
+        return job_id
+
+    def claim(self, owner: str, lease: float):
+        # Oldest queued job, or a running one whose worker died; (id, request) or None
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, lease = ?, updated = ? WHERE id = ("
+                "SELECT id FROM jobs WHERE status = 'queued' OR (status = 'running' AND lease < ?) "
+                "ORDER BY created LIMIT 1) RETURNING id, request",
+                (owner, now + lease, now, now)
+            ).fetchone()
+            if row is None:
+                return None
+            # A job taken over from a dead worker starts over
+            self._db.execute("DELETE FROM job_events WHERE job_id = ?", (row[0],))
+        return row[0], json.loads(row[1])
+
+    def renew(self, job_ids, owner: str, lease: float) -> list:
+        # Extends our leases and returns the ids that are no longer ours to run (cancelled or taken over)
+        lost = []
+        with self._lock:
+            for job_id in job_ids:
+                if not self._db.execute(
+                    "UPDATE jobs SET lease = ? WHERE id = ? AND owner = ? AND status = 'running'",
+                    (time.time() + lease, job_id, owner)
+                ).rowcount:
+                    lost.append(job_id)
+        return lost
+
+    def release(self, job_id: str, owner: str):
+        # Shutting down: hand the job back to the queue
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'queued', owner = NULL, lease = 0 WHERE id = ? AND owner = ? "
+                "AND status = 'running'", (job_id, owner)
+            )
+
+    def append(self, job_id: str, event: str, data):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO job_events SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ? FROM job_events WHERE job_id = ?",
+                (job_id, event, json.dumps(data), job_id)
+            )
+
+    def finish(self, job_id: str, owner: str, status: str, result):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, updated = ? WHERE id = ? AND owner = ? AND status = 'running'",
+                (status, json.dumps(result), time.time(), job_id, owner)
+            )
+
+    def cancel(self, job_id: str):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'cancelled', updated = ? WHERE id = ? AND status IN ('queued', 'running')",
+                (time.time(), job_id)
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, result, created, updated, (SELECT COUNT(*) FROM job_events WHERE job_id = jobs.id) "
+                "FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        status, result, created, updated, events = row
+        job = {"job_id": job_id, "status": status, "created": created, "updated": updated, "events": events}
+        if status in FINISHED:
+            job["result"] = json.loads(result) if result else None
+            job["expires"] = updated + self.retention
+        return job
+
+    def events(self, job_id: str, after: int = 0) -> list:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT seq, event, data FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq", (job_id, after)
+            ).fetchall()
+        return [(seq, event, json.loads(data)) for seq, event, data in rows]
+
+    def purge(self) -> int:
+        cutoff = time.time() - self.retention
+        with self._lock:
+            expired = [row[0] for row in self._db.execute(
+                "SELECT id FROM jobs WHERE status IN ('done', 'error', 'cancelled') AND updated < ?", (cutoff,)
+            )]
+            for job_id in expired:
+                self._db.execute("DELETE FROM job_events WHERE job_id = ?", (job_id,))
+                self._db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        return len(expired)
+
+    def counts(self) -> dict:
+        with self._lock:
+            return dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+class JobQueue:
+    # Runs submitted jobs on a pool of workers. `run(request)` returns an async generator of
+    # (event, data) like the pipeline stream; "token" events are live-only and not stored.
+    def __init__(self, run, store: JobStore = None, workers=JOB_WORKERS, lease=JOB_LEASE):
+        self.run = run
+        self.store = store or JobStore()
+        self.workers = workers
+        self.lease = lease
+        self.owner = uuid.uuid4().hex
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0, "purged": 0}
+        self._running = {}
+        self._tasks = []
+        self._wake = None
+
+    def submit(self, request: dict) -> str:
+        job_id = self.store.submit(request)
+        self.stats["submitted"] += 1
+        if self._wake is not None:
+            self._wake.set()
+        return job_id
+
+    def cancel(self, job_id: str):
+        job = self.store.cancel(job_id)
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+        return job
+
+    async def _execute(self, job_id: str, request: dict):
+        result = None
+        try:
+            async for event, data in self.run(request):
+                if event == "token":
+                    continue
+                self.store.append(job_id, event, data)
+                if event == "result":
+                    result = data
+        except Exception as e:
+            print(f"❌ Job {job_id} failed: {e}")
+            result = {"status": "error", "error": str(e), "pipeline_trace": []}
+        status = "error" if not result or result.get("status") == "error" else "done"
+        self.store.finish(job_id, self.owner, status, result)
+        self.stats["failed" if status == "error" else "completed"] += 1
+
+    async def _worker(self):
+        while True:
+            claimed = self.store.claim(self.owner, self.lease)
+            if claimed is None:
+                self._wake.clear()
+                try:
+                    # Other processes submit too, so keep polling even without a local wake-up
+                    await asyncio.wait_for(self._wake.wait(), JOB_POLL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            job_id, request = claimed
+            print(f"🧾 Running job {job_id}")
+            task = self._running[job_id] = asyncio.create_task(self._execute(job_id, request))
+            try:
+                await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    # The worker itself is shutting down, the job goes back to the queue
+                    task.cancel()
+                    self.store.release(job_id, self.owner)
+                    raise
+                self.stats["cancelled"] += 1
+                print(f"🛑 Job {job_id} cancelled")
+            finally:
+                self._running.pop(job_id, None)
+
+    async def _maintain(self):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            # Jobs cancelled through another process stop here too
+            for job_id in self.store.renew(list(self._running), self.owner, self.lease):
+                task = self._running.get(job_id)
+                if task is not None:
+                    task.cancel()
+            purged = self.store.purge()
+            self.stats["purged"] += purged
+
+    async def start(self):
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._maintain()))
+        print(f"🧾 Job queue started with {self.workers} workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def follow(self, job_id: str, after: int = 0):
+        # Stored events past `after`, then new ones as they arrive, ending with the job's "status".
+        # Events are stored before the job finishes, so reading them after its status misses nothing.
+        while True:
+            job = self.store.get(job_id)
+            if job is None:
+                return
+            for seq, event, data in self.store.events(job_id, after):
+                after = seq
+                yield event, {**data, "seq": seq} if isinstance(data, dict) else data
+            if job["status"] in FINISHED:
+                yield "status", {"job_id": job_id, "status": job["status"], "seq": after}
+                return
+            await asyncio.sleep(JOB_POLL)
+
+    def info(self) -> dict:
+        counts = {f"{status}_jobs": count for status, count in self.store.counts().items()}
+        return {**self.stats, **counts, "running_here": len(self._running)}
+
+
+def install(app, queue: JobQueue):
+    # Adds GET /jobs/{id}, GET /jobs/{id}/events?after=N and DELETE /jobs/{id}; the agent adds its typed POST /jobs
+    app.add_event_handler("startup", queue.start)
+    app.add_event_handler("shutdown", queue.stop)
+
+    def job_or_404(job_id: str):
+        job = queue.store.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+        return job
+
+    @app.get("/jobs/{job_id}")
+    def get_job(job_id: str):
+        return job_or_404(job_id)
+
+    @app.get("/jobs/{job_id}/events")
+    def job_events(job_id: str, after: int = 0):
+        # Reconnecting clients pass the last "seq" they saw
+        job_or_404(job_id)
+        return StreamingResponse(
+            sse.encode(queue.follow(job_id, after)), media_type="text/event-stream", headers=sse.HEADERS
+        )
+
+    @app.delete("/jobs/{job_id}")
+    async def cancel_job(job_id: str):
+        # Async so the local task is cancelled from its own event loop
+        job_or_404(job_id)
+        return queue.cancel(job_id)
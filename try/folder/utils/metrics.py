@@ -0,0 +1,123 @@
+import time
+
+from fastapi import Response
+from starlette.routing import Match
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+from utils import http_client
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REQUEST_LATENCY = Histogram(
+    "agent_request_seconds", "HTTP request latency", ["method", "path", "status"], buckets=LATENCY_BUCKETS
+)
+IN_FLIGHT = Gauge("agent_requests_in_flight", "Requests currently being handled", ["path"])
+SEARCH_LATENCY = Histogram("search_seconds", "SerpAPI search latency", ["cached"], buckets=LATENCY_BUCKETS)
+FETCH_LATENCY = Histogram("fetch_seconds", "Page download latency", ["outcome"], buckets=LATENCY_BUCKETS)
+PARSE_LATENCY = Histogram("parse_seconds", "Time spent extracting text from a page", buckets=LATENCY_BUCKETS)
+LLM_LATENCY = Histogram("llm_seconds", "LLM call latency", ["model", "op"], buckets=LATENCY_BUCKETS)
+LLM_FIRST_TOKEN = Histogram(
+    "llm_first_token_seconds", "Time to the first streamed LLM token", ["model", "op"], buckets=LATENCY_BUCKETS
+)
+CRITIC_VERDICTS = Counter("critic_verdicts_total", "Fresh critic verdicts by the cascade tier that decided", ["tier"])
+LLM_ERRORS = Counter("llm_errors_total", "Failed LLM calls", ["model", "op"])
+GOVERNOR_WAIT = Histogram(
+    "governor_wait_seconds", "Time callers queued for a rate limit token", ["limit"], buckets=LATENCY_BUCKETS
+)
+GOVERNOR_RETRIES = Counter("governor_retries_total", "Calls retried by the governor", ["limit", "reason"])
+
+
+class StatsCollector:
+    # Exposes the stats dicts our caches, pools and resolvers already keep as gauges
+    def __init__(self):
+        self.sources = {}
+
+    def collect(self):
+        caches = GaugeMetricFamily("agent_stat", "Cache, resolver and registry counters", labels=["source", "stat"])
+        for name, source in list(self.sources.items()):
+            for stat, value in source().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    caches.add_metric([name, stat], value)
+        yield caches
+
+        pools = GaugeMetricFamily("http_pool_connections", "Pooled HTTP connections", labels=["client", "host", "state"])
+        requests = GaugeMetricFamily("http_requests_per_host", "Requests sent per host", labels=["host"])
+        stats = http_client.pool_stats()
+        for client in ("sync", "async"):
+            for host, states in stats[client].items():
+                for state, value in states.items():
+                    pools.add_metric([client, host, state], value)
+        for host, value in stats["requests_per_host"].items():
+            requests.add_metric([host], value)
+        yield pools
+        yield requests
+
+
+collector = StatsCollector()
+REGISTRY.register(collector)
+
+
+def register_stats(name, source):
+    # `source` is a callable returning a flat dict of numbers
+    collector.sources[name] = source
+
+
+def timed(step: dict, started: float) -> dict:
+    # Stamp a pipeline_trace step with wall-clock start/end and its duration
+    ended = time.time()
+    step.update({
+        "started_at": round(started, 3),
+        "ended_at": round(ended, 3),
+        "duration_ms": round((ended - started) * 1000, 1)
+    })
+    return step
+
+
+def route_path(app, scope) -> str:
+    # Label by route template so path parameters don't explode the label set
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+class RequestMetricsMiddleware:
+    # Plain ASGI rather than @app.middleware, which returns as soon as the headers are sent:
+    # streamed responses stay in flight and are timed until their last body chunk
+    def __init__(self, app, routed):
+        self.app = app
+        self.routed = routed
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        path = route_path(self.routed, scope)
+        if path == "/metrics":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_tracked(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_FLIGHT.labels(path).inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_tracked)
+        finally:
+            IN_FLIGHT.labels(path).dec()
+            REQUEST_LATENCY.labels(scope["method"], path, str(status)).observe(time.perf_counter() - started)
+
+
+def install(app):
+    app.add_middleware(RequestMetricsMiddleware, routed=app)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
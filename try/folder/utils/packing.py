@@ -0,0 +1,124 @@
+import math
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from utils.bm25 import BM25, tokens
+
+# Per-prompt token budgets; the prompt templates themselves are small and fixed
+CONTEXT_TOKENS = int(os.getenv("CONTEXT_TOKENS", "1200"))
+CRITIC_ANSWER_TOKENS = int(os.getenv("CRITIC_ANSWER_TOKENS", "1500"))
+REFINER_ANSWER_TOKENS = int(os.getenv("REFINER_ANSWER_TOKENS", "1500"))
+REFINER_FEEDBACK_TOKENS = int(os.getenv("REFINER_FEEDBACK_TOKENS", "300"))
+# Callers wait at most this long (from the start of loading) for the encoding, then estimate until it arrives
+TOKENIZER_TIMEOUT = float(os.getenv("TOKENIZER_TIMEOUT", "5"))
+
+_encoding = None
+_encoding_loaded = threading.Event()
+_encoding_lock = threading.Lock()
+_loading = False
+_deadline = 0.0
+
+# Punctuation inside a token ("3.11", "python.org", "e.g.") does not end a sentence
+SENTENCE_RE = re.compile(r"(?:[^\n.!?]|[.!?](?!\s|$))*(?:[.!?]+(?=\s|$)|\n|$)")
+PINNED_RE = re.compile(r"^Source:")
+
+
+def _claim_load() -> bool:
+    global _loading, _deadline
+    with _encoding_lock:
+        if _loading:
+            return False
+        _loading = True
+        _deadline = time.monotonic() + TOKENIZER_TIMEOUT
+        return True
+
+
+def _load():
+    global _encoding
+    try:
+        import tiktoken
+
+        # Llama 3 uses a tiktoken BPE as well, cl100k counts land within a few percent of it
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # Not installed, or the encoding could not be downloaded: ~4 characters per token for English
+        print(f"⚠️ tiktoken unavailable ({e}), estimating 4 characters per token")
+    finally:
+        _encoding_loaded.set()
+
+
+def load_encoding():
+    # For the agents' startup warm-up threads: tiktoken downloads the BPE file the first time it is needed
+    if _claim_load():
+        _load()
+
+
+def get_encoding():
+    # Never blocks a request for longer than what is left of TOKENIZER_TIMEOUT
+    if not _encoding_loaded.is_set():
+        if _claim_load():
+            threading.Thread(target=_load, name="tokenizer-load", daemon=True).start()
+        if not _encoding_loaded.wait(max(0.0, _deadline - time.monotonic())):
+            return None
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 4)
+
+
+def sentences(text: str) -> list:
+    # Sentence-ish spans that join back into `text`; newlines end a span so headers and list items stay whole
+    return [s for s in SENTENCE_RE.findall(text) if s]
+
+
+def truncate(text: str, budget: int) -> str:
+    # Last resort for a single span that is over budget on its own
+    encoding = get_encoding()
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:budget])
+    return text[:budget * 4]
+
+
+def pack(text: str, budget: int, question: str = "") -> str:
+    # Fits `text` into `budget` tokens by dropping whole sentences. With a question the sentences
+    # most relevant to it are kept, otherwise the leading ones; either way in their original order.
+    if count_tokens(text) <= budget:
+        return text
+    spans = sentences(text)
+    # Whitespace-only spans (blank lines) are free and always kept so the layout survives
+    costs = np.array([count_tokens(s) if s.strip() else 0 for s in spans])
+
+    order = np.arange(len(spans))
+    if question:
+        scores = BM25([tokens(s) for s in spans]).scores(tokens(question))
+        order = np.argsort(-scores, kind="stable")
+    pinned = [i for i, s in enumerate(spans) if PINNED_RE.match(s.strip()) or not costs[i]]
+    rest = set(pinned)
+    order = pinned + [i for i in order if i not in rest]
+
+    chosen, used = [], 0
+    for i in order:
+        if used + costs[i] <= budget:
+            chosen.append(i)
+            used += costs[i]
+    if not any(costs[i] for i in chosen):
+        return truncate(text, budget)
+    return "".join(spans[i] for i in sorted(chosen)).strip()
+
+
+def pack_fields(fields: dict, budgets: dict, question: str = "") -> dict:
+    # Applies pack() to the fields that have a budget, the rest pass through
+    return {
+        name: pack(value, budgets[name], question) if name in budgets and isinstance(value, str) else value
+        for name, value in fields.items()
+    }
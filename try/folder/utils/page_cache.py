@@ -0,0 +1,124 @@
+import os
+import re
+import threading
+import time
+
+from utils.db import open_db, shared
+
+PAGE_CACHE_PATH = os.getenv("PAGE_CACHE_PATH", ".cache/pages.sqlite")
+# Used when the origin does not send Cache-Control: max-age
+PAGE_CACHE_FRESH = float(os.getenv("PAGE_CACHE_FRESH", "300"))
+# How long past freshness a page may still be served while it is revalidated
+PAGE_CACHE_STALE = float(os.getenv("PAGE_CACHE_STALE", str(24 * 3600)))
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "20000"))
+
+
+def storable(headers) -> bool:
+    return "no-store" not in headers.get("cache-control", "")
+
+
+def max_age(headers) -> float:
+    # 0 means the page must be revalidated before every use
+    cache_control = headers.get("cache-control", "")
+    if "no-cache" in cache_control:
+        return 0.0
+    match = re.search(r"max-age=(\d+)", cache_control)
+    return float(match.group(1)) if match else PAGE_CACHE_FRESH
+
+
+class PageEntry:
+    def __init__(self, content, etag, last_modified, validated, max_age):
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+        self.validated = validated
+        self.max_age = max_age
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.validated
+
+    @property
+    def fresh(self) -> bool:
+        return self.age < self.max_age
+
+    @property
+    def usable_stale(self) -> bool:
+        # no-cache and max-age=0 pages are never served before the origin confirms them
+        return self.max_age > 0 and self.age < self.max_age + PAGE_CACHE_STALE
+
+    def conditional_headers(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class PageCache:
+    # Extracted page text keyed by (extractor, url), with the validators needed to revalidate it
+    def __init__(self, path=PAGE_CACHE_PATH, max_entries=PAGE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.stats = {"fresh_hits": 0, "stale_hits": 0, "revalidated": 0, "misses": 0, "stored": 0, "no_store": 0}
+        self._lock = threading.Lock()
+        self._db = open_db(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "extractor TEXT, url TEXT, content TEXT, etag TEXT, last_modified TEXT, "
+            "validated REAL, max_age REAL, PRIMARY KEY (extractor, url))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS pages_validated ON pages (validated)")
+
+    def get(self, extractor: str, url: str):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT content, etag, last_modified, validated, max_age FROM pages WHERE extractor = ? AND url = ?",
+                (extractor, url)
+            ).fetchone()
+        return PageEntry(*row) if row else None
+
+    def delete(self, extractor: str, url: str):
+        with self._lock:
+            self._db.execute("DELETE FROM pages WHERE extractor = ? AND url = ?", (extractor, url))
+
+    def put(self, extractor: str, url: str, content, headers):
+        if not storable(headers):
+            # Also forget what an earlier response allowed us to keep
+            self.stats["no_store"] += 1
+            self.delete(extractor, url)
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (extractor, url, content, headers.get("etag"), headers.get("last-modified"),
+                 time.time(), max_age(headers))
+            )
+            overflow = self._db.execute("SELECT COUNT(*) FROM pages").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._db.execute(
+                    "DELETE FROM pages WHERE rowid IN (SELECT rowid FROM pages ORDER BY validated LIMIT ?)",
+                    (overflow,)
+                )
+        self.stats["stored"] += 1
+
+    def touch(self, extractor: str, url: str, headers):
+        # A 304 confirms the cached extract, so only the validation time moves
+        if not storable(headers):
+            self.stats["no_store"] += 1
+            self.delete(extractor, url)
+            return
+        with self._lock:
+            self._db.execute(
+                "UPDATE pages SET validated = ?, max_age = ? WHERE extractor = ? AND url = ?",
+                (time.time(), max_age(headers), extractor, url)
+            )
+        self.stats["revalidated"] += 1
+
+    def info(self) -> dict:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+        return {**self.stats, "entries": entries, "max_entries": self.max_entries}
+
+
+get_cache = shared(PageCache)
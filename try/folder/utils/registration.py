@@ -0,0 +1,139 @@
+import os
+import random
+import threading
+import time
+
+from utils import http_client
+from utils.balancing import ewma
+
+HEARTBEAT_INTERVAL = float(os.getenv("HEARTBEAT_INTERVAL", "10"))
+# Retry delays while the registry is unreachable: doubles from INITIAL up to MAX, with jitter
+REGISTER_BACKOFF_INITIAL = float(os.getenv("REGISTER_BACKOFF_INITIAL", "0.5"))
+REGISTER_BACKOFF_MAX = float(os.getenv("REGISTER_BACKOFF_MAX", "30"))
+# Re-send the full card this often even while heartbeats succeed
+REREGISTER_INTERVAL = float(os.getenv("REREGISTER_INTERVAL", "300"))
+
+
+class LoadTracker:
+    # Outstanding A2A requests and EWMA latency, reported to the registry with each heartbeat
+    def __init__(self, prefix="/a2a"):
+        self.prefix = prefix
+        self.outstanding = 0
+        self.latency_ms = 0.0
+
+    def finished(self, started: float):
+        self.outstanding -= 1
+        self.latency_ms = ewma(self.latency_ms, (time.monotonic() - started) * 1000)
+
+
+class LoadTrackingMiddleware:
+    # Plain ASGI rather than @app.middleware: the wrapped app only returns once the last body chunk
+    # is sent, so streamed /a2a/stream responses count as outstanding for as long as they run
+    def __init__(self, app, tracker: LoadTracker):
+        self.app = app
+        self.tracker = tracker
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.tracker.prefix):
+            await self.app(scope, receive, send)
+            return
+        self.tracker.outstanding += 1
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.tracker.finished(started)
+
+
+class AgentRegistration:
+    # Registers in the background once the server starts, so a registry outage never blocks or loses an agent
+    def __init__(self, registry_url, card, interval=HEARTBEAT_INTERVAL):
+        self.registry_url = registry_url
+        self.card = card
+        self.interval = interval
+        self.instance_id = card.get("instance_id", "")
+        self.tracker = LoadTracker()
+        self.registered = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def register(self) -> bool:
+        try:
+            res = http_client.post(f"{self.registry_url}/register", json=self.card, timeout=5)
+            res.raise_for_status()
+            data = res.json()
+            self.instance_id = data.get("instance_id", self.instance_id)
+            self.registered.set()
+            print("✅ Registered with registry:", data)
+            return True
+        except Exception as e:
+            self.registered.clear()
+            print("❌ Failed to register with registry:", e)
+            return False
+
+    def heartbeat(self):
+        if not self.instance_id:
+            return self.register()
+        res = http_client.post(
+            f"{self.registry_url}/heartbeat",
+            json={
+                "instance_id": self.instance_id,
+                "outstanding": self.tracker.outstanding,
+                "latency_ms": self.tracker.latency_ms
+            },
+            timeout=5
+        )
+        if res.status_code == 404:
+            # Evicted or the registry restarted
+            return self.register()
+        return res.ok
+
+    def _register_with_backoff(self):
+        delay = REGISTER_BACKOFF_INITIAL
+        while not self._stopped.is_set() and not self.register():
+            wait = random.uniform(delay / 2, delay)
+            print(f"⏳ Retrying registration in {wait:.1f}s")
+            self._stopped.wait(wait)
+            delay = min(delay * 2, REGISTER_BACKOFF_MAX)
+
+    def _run(self):
+        self._register_with_backoff()
+        last_registered = time.monotonic()
+        while not self._stopped.wait(self.interval):
+            if time.monotonic() - last_registered >= REREGISTER_INTERVAL:
+                self._register_with_backoff()
+                last_registered = time.monotonic()
+                continue
+            try:
+                ok = self.heartbeat()
+            except Exception as e:
+                print("⚠️ Heartbeat to registry failed:", e)
+                ok = False
+            if not ok:
+                # Registry unreachable or rejecting us, go back to registering with backoff
+                self.registered.clear()
+                self._register_with_backoff()
+                last_registered = time.monotonic()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="registry-registration", daemon=True)
+            self._thread.start()
+
+    def deregister(self):
+        self._stopped.set()
+        if not self.instance_id:
+            return
+        try:
+            http_client.post(
+                f"{self.registry_url}/deregister",
+                json={"instance_id": self.instance_id},
+                timeout=2
+            )
+        except Exception as e:
+            print("❌ Failed to deregister from registry:", e)
+
+    def install(self, app):
+        app.add_middleware(LoadTrackingMiddleware, tracker=self.tracker)
+        app.add_event_handler("startup", self.start)
+        app.add_event_handler("shutdown", self.deregister)
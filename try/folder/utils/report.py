@@ -0,0 +1,168 @@
+import os
+import re
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+REPORT_DIR = os.getenv("REPORT_DIR", "reports")
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+# Characters per line, sized for 12pt Helvetica between the page margins
+WRAP_WIDTH = 90
+
+PAGE_WIDTH, PAGE_HEIGHT = 595.28, 841.89  # A4 in points
+MARGIN_X, MARGIN_TOP, MARGIN_BOTTOM = 28.35, 28.35, 42.52
+TITLE = ("F2", 14, (0, 0, 0.5), 20)  # font, size, rgb, leading
+BODY = ("F1", 12, (0, 0, 0), 16)
+SECTION_GAP = 14
+
+_executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix="report")
+
+
+def sanitize_text(text):
+    # Remove emojis and non-ASCII characters
+    return re.sub(r'[^\x00-\x7F]+', '', text)
+
+
+def wrap_lines(text: str, width: int = WRAP_WIDTH):
+    # Greedy word wrap in one pass; words longer than a line are split
+    line, length = [], 0
+    for word in text.split():
+        while len(word) > width:
+            if line:
+                yield " ".join(line)
+                line, length = [], 0
+            yield word[:width]
+            word = word[width:]
+        if line and length + 1 + len(word) > width:
+            yield " ".join(line)
+            line, length = [], 0
+        length += len(word) + (1 if line else 0)
+        line.append(word)
+    if line:
+        yield " ".join(line)
+
+
+def escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+class PdfWriter:
+    # Minimal text-only PDF writer: every finished page goes straight to `stream`,
+    # only object offsets are kept until the cross-reference table is written on close()
+    PAGES, CATALOG, FONT_REGULAR, FONT_BOLD = 1, 2, 3, 4
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.position = 0
+        self.offsets = {}
+        self.pages = []
+        self.next_id = 5
+        self.ops = []
+        self.y = PAGE_HEIGHT - MARGIN_TOP
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _write(self, data: bytes):
+        self.stream.write(data)
+        self.position += len(data)
+
+    def _object(self, obj_id: int, body: bytes):
+        self.offsets[obj_id] = self.position
+        self._write(f"{obj_id} 0 obj\n".encode() + body + b"\nendobj\n")
+
+    def _allocate(self) -> int:
+        self.next_id += 1
+        return self.next_id - 1
+
+    def line(self, text: str, style=BODY):
+        font, size, (r, g, b), leading = style
+        if self.y - leading < MARGIN_BOTTOM:
+            self.page_break()
+        self.y -= leading
+        self.ops.append(
+            f"BT /{font} {size} Tf {r} {g} {b} rg {MARGIN_X} {self.y:.2f} Td ({escape(text)}) Tj ET"
+        )
+
+    def space(self, height: float):
+        self.y -= height
+
+    def page_break(self):
+        if not self.ops:
+            self.y = PAGE_HEIGHT - MARGIN_TOP
+            return
+        content = zlib.compress("\n".join(self.ops).encode("latin-1", "replace"))
+        content_id, page_id = self._allocate(), self._allocate()
+        self._object(
+            content_id,
+            f"<< /Length {len(content)} /Filter /FlateDecode >>\nstream\n".encode() + content + b"\nendstream"
+        )
+        self._object(page_id, (
+            f"<< /Type /Page /Parent {self.PAGES} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 {self.FONT_REGULAR} 0 R /F2 {self.FONT_BOLD} 0 R >> >> "
+            f"/Contents {content_id} 0 R >>"
+        ).encode())
+        self.pages.append(page_id)
+        self.ops = []
+        self.y = PAGE_HEIGHT - MARGIN_TOP
+
+    def close(self):
+        if self.ops or not self.pages:
+            self.ops = self.ops or ["% empty"]
+            self.page_break()
+        self._object(self.FONT_REGULAR, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+        self._object(self.FONT_BOLD, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold >>")
+        kids = " ".join(f"{page} 0 R" for page in self.pages)
+        self._object(self.PAGES, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>".encode())
+        self._object(self.CATALOG, f"<< /Type /Catalog /Pages {self.PAGES} 0 R >>".encode())
+
+        xref = self.position
+        entries = ["0000000000 65535 f "] + [f"{self.offsets[i]:010d} 00000 n " for i in range(1, self.next_id)]
+        self._write(f"xref\n0 {self.next_id}\n".encode() + "\n".join(entries).encode() + b"\n")
+        self._write(
+            f"trailer\n<< /Size {self.next_id} /Root {self.CATALOG} 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+        )
+        self.stream.flush()
+
+
+def write_sections(writer: PdfWriter, sections: dict):
+    for title, content in sections.items():
+        for chunk in wrap_lines(sanitize_text(str(title))):
+            writer.line(chunk, TITLE)
+        for paragraph in sanitize_text(str(content)).split("\n"):
+            for chunk in wrap_lines(paragraph):
+                writer.line(chunk)
+        writer.space(SECTION_GAP)
+
+
+def render(documents, stream):
+    # Each document is a {title: text} dict and starts on a new page
+    writer = PdfWriter(stream)
+    for sections in documents:
+        writer.page_break()
+        write_sections(writer, sections)
+    writer.close()
+
+
+def report_path(name: str = "report") -> str:
+    slug = re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")[:40] or "report"
+    return os.path.join(REPORT_DIR, f"{slug}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.pdf")
+
+
+def render_to_file(documents, path: str) -> str:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    partial = f"{path}.part"
+    # Readers never see a half written report
+    with open(partial, "wb") as stream:
+        render(documents, stream)
+    os.replace(partial, path)
+    return path
+
+
+def submit(sections: dict, name: str = "report"):
+    # Renders on the report pool; the Future resolves to the written path
+    return _executor.submit(render_to_file, [sections], report_path(name))
+
+
+def submit_batch(documents: list, name: str = "batch"):
+    # Many answers in one document, each starting on its own page; rendered on the report pool too
+    return _executor.submit(render_to_file, list(documents), report_path(name))
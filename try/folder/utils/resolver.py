@@ -0,0 +1,161 @@
+import asyncio
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from utils import http_client
+from utils.balancing import ewma, pick
+
+RESOLVE_TTL = float(os.getenv("RESOLVE_TTL", "60"))
+RESOLVE_NEGATIVE_TTL = float(os.getenv("RESOLVE_NEGATIVE_TTL", "5"))
+# Entries older than this fraction of their TTL are refreshed in the background
+RESOLVE_REFRESH_AHEAD = float(os.getenv("RESOLVE_REFRESH_AHEAD", "0.8"))
+RESOLVE_WATCH = os.getenv("RESOLVE_WATCH", "1") == "1"
+WATCH_TIMEOUT = float(os.getenv("RESOLVE_WATCH_TIMEOUT", "30"))
+RESOLVE_POLICY = os.getenv("RESOLVE_POLICY", "round_robin")
+
+
+class RegistryResolver:
+    def __init__(self, registry_url, ttl=RESOLVE_TTL, negative_ttl=RESOLVE_NEGATIVE_TTL, watch=RESOLVE_WATCH,
+                 policy=RESOLVE_POLICY):
+        self.registry_url = registry_url
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.watch = watch
+        self.policy = policy
+        self._entries = {}  # tag -> (instances or None, fetched_at, ttl)
+        self._outstanding = defaultdict(int)  # endpoint -> requests this process has in flight
+        self._latency_ms = {}  # endpoint -> EWMA latency seen by this process
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._refresher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="resolver-refresh")
+        self._watcher = None
+        self.stats = {"hits": 0, "misses": 0, "negative_hits": 0, "refreshes": 0, "invalidations": 0}
+
+    def _fetch(self, tag):
+        res = http_client.get(f"{self.registry_url}/instances", params={"tag": tag}, timeout=5)
+        if res.status_code == 404:
+            return None, self.negative_ttl
+        res.raise_for_status()
+        return res.json(), self.ttl
+
+    def _store(self, tag):
+        instances, ttl = self._fetch(tag)
+        with self._lock:
+            self._entries[tag] = (instances, time.monotonic(), ttl)
+        return instances
+
+    def _refresh(self, tag):
+        try:
+            self._store(tag)
+            self.stats["refreshes"] += 1
+        except Exception as e:
+            print(f"⚠️ Background resolve of '{tag}' failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(tag)
+
+    def instances(self, tag):
+        self._ensure_watcher()
+        with self._lock:
+            entry = self._entries.get(tag)
+        if entry:
+            instances, fetched_at, ttl = entry
+            age = time.monotonic() - fetched_at
+            if age < ttl:
+                self.stats["hits" if instances else "negative_hits"] += 1
+                if instances and age > ttl * RESOLVE_REFRESH_AHEAD:
+                    with self._lock:
+                        schedule = tag not in self._refreshing
+                        self._refreshing.add(tag)
+                    if schedule:
+                        self._refresher.submit(self._refresh, tag)
+                return instances
+
+        self.stats["misses"] += 1
+        try:
+            return self._store(tag)
+        except Exception as e:
+            print(f"❌ Failed to resolve '{tag}' from registry: {e}")
+            # Serve the stale entry rather than nothing while the registry is unreachable
+            return entry[0] if entry else None
+
+    def resolve(self, tag, name="a2a"):
+        # Pick an instance locally, overlaying what this process knows about its own traffic
+        candidates = []
+        for instance in self.instances(tag) or []:
+            url = instance["card"].get("endpoints", {}).get(name)
+            candidates.append({
+                "card": instance["card"],
+                "outstanding": instance.get("outstanding", 0) + self._outstanding[url],
+                "latency_ms": self._latency_ms.get(url) or instance.get("latency_ms", 0.0),
+            })
+        chosen = pick(tag, candidates, self.policy)
+        return chosen["card"] if chosen else None
+
+    def endpoint(self, tag, name="a2a"):
+        card = self.resolve(tag, name)
+        return (card or {}).get("endpoints", {}).get(name)
+
+    def _begin(self, url):
+        with self._lock:
+            self._outstanding[url] += 1
+        return time.monotonic()
+
+    def _finish(self, url, started):
+        elapsed_ms = (time.monotonic() - started) * 1000
+        with self._lock:
+            self._outstanding[url] -= 1
+            self._latency_ms[url] = ewma(self._latency_ms.get(url), elapsed_ms)
+
+    @asynccontextmanager
+    async def ause(self, tag, name="a2a"):
+        # A cache miss means a registry round trip, keep it off the event loop
+        url = await asyncio.to_thread(self.endpoint, tag, name)
+        if not url:
+            yield None
+            return
+        started = self._begin(url)
+        try:
+            yield url
+        finally:
+            self._finish(url, started)
+
+    def invalidate(self, tags=None):
+        with self._lock:
+            if tags is None:
+                self._entries.clear()
+            else:
+                for tag in tags:
+                    self._entries.pop(tag, None)
+        self.stats["invalidations"] += 1
+
+    def _ensure_watcher(self):
+        if not self.watch or self._watcher is not None:
+            return
+        with self._lock:
+            if self._watcher is None:
+                self._watcher = threading.Thread(target=self._watch_loop, name="resolver-watch", daemon=True)
+                self._watcher.start()
+
+    def _watch_loop(self):
+        epoch, version, backoff = "", 0, 1
+        while True:
+            try:
+                res = http_client.get(
+                    f"{self.registry_url}/watch",
+                    params={"since": version, "epoch": epoch, "timeout": WATCH_TIMEOUT},
+                    timeout=WATCH_TIMEOUT + 5,
+                )
+                data = res.json()
+                if data.get("reset"):
+                    self.invalidate()
+                elif data.get("changed"):
+                    self.invalidate(data["changed"])
+                epoch, version, backoff = data.get("epoch", ""), data.get("version", 0), 1
+            except Exception:
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
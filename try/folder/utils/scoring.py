@@ -0,0 +1,73 @@
+import json
+import os
+
+import numpy as np
+
+from utils.bm25 import tokens
+from utils.packing import CONTEXT_TOKENS, count_tokens, pack
+
+# Minimum block score to keep a block of the winning page
+BLOCK_MIN_SCORE = float(os.getenv("BLOCK_MIN_SCORE", "0.2"))
+
+TAG_WEIGHTS = {"p": 1.0, "li": 0.7, "h2": 0.4}
+# text density, link density, tag type, term overlap, length
+FEATURE_WEIGHTS = np.array([0.25, -1.0, 0.3, 1.5, 0.2])
+
+
+def terms(text: str) -> set:
+    return set(tokens(text))
+
+
+def pack_candidate(url: str, blocks) -> str:
+    # Page cache entries are text, so a page's blocks are stored as JSON
+    return json.dumps({"url": url, "blocks": [list(block) for block in blocks]})
+
+
+def feature_matrix(blocks, question: str) -> np.ndarray:
+    # One row per block: text density, link density, tag type, term overlap with the question, length
+    query = sorted(terms(question))
+    n = len(blocks)
+    chars = np.fromiter((len(b[1]) for b in blocks), dtype=float, count=n)
+    words = np.fromiter((b[1].count(" ") + 1 for b in blocks), dtype=float, count=n)
+    links = np.fromiter((b[2] for b in blocks), dtype=float, count=n)
+    elements = np.fromiter((b[3] for b in blocks), dtype=float, count=n)
+    tags = np.fromiter((TAG_WEIGHTS.get(b[0], 0.5) for b in blocks), dtype=float, count=n)
+
+    if query:
+        present = np.zeros((n, len(query)), dtype=bool)
+        for row, block in enumerate(blocks):
+            block_terms = terms(block[1])
+            present[row] = [term in block_terms for term in query]
+        overlap = present.mean(axis=1)
+    else:
+        overlap = np.zeros(n)
+
+    density = np.log1p(words / (elements + 1)) / np.log1p(100)
+    link_density = np.divide(links, chars, out=np.zeros(n), where=chars > 0)
+    length = np.minimum(np.log1p(chars) / np.log1p(1000), 1.0)
+    return np.column_stack([np.minimum(density, 1.0), link_density, tags, overlap, length])
+
+
+def best_content(candidates, question: str, max_tokens: int = CONTEXT_TOKENS):
+    # `candidates` are pack_candidate() strings from several pages; all their blocks are scored in one batch
+    pages = [json.loads(c) for c in candidates if c]
+    pages = [page for page in pages if page["blocks"]]
+    if not pages:
+        return None
+
+    blocks = [block for page in pages for block in page["blocks"]]
+    page_of = np.repeat(np.arange(len(pages)), [len(page["blocks"]) for page in pages])
+    scores = feature_matrix(blocks, question) @ FEATURE_WEIGHTS
+
+    # A page is worth the relevant text it carries, each block counting up to ~500 chars
+    chars = np.fromiter((len(b[1]) for b in blocks), dtype=float, count=len(blocks))
+    weight = np.clip(scores, 0, None) * np.minimum(chars, 500) / 500
+    best = int(np.argmax(np.bincount(page_of, weights=weight, minlength=len(pages))))
+
+    indices = np.flatnonzero(page_of == best)
+    kept = indices[scores[indices] >= BLOCK_MIN_SCORE]
+    if not kept.size:
+        kept = indices
+    header = f"Source: {pages[best]['url']}\n\n"
+    text = pack("\n".join(blocks[i][1] for i in kept), max_tokens - count_tokens(header), question)
+    return header + text
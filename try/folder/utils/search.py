@@ -0,0 +1,50 @@
+import os
+import time
+
+from utils import governor, http_client
+from utils.metrics import SEARCH_LATENCY
+from utils.serp_cache import get_cache
+
+SERPAPI_URL = os.getenv("SERPAPI_URL", "https://serpapi.com/search.json")
+
+
+def checked(res):
+    # Throttling and server errors raise so the governor can retry them; other errors keep their JSON body
+    if res.status_code in governor.RETRY_STATUSES:
+        res.raise_for_status()
+    return res
+
+
+def search(params: dict) -> dict:
+    params = {"engine": "google", **params}
+    started = time.perf_counter()
+    cache = get_cache()
+    cached = cache.get(params)
+    if cached is not None:
+        SEARCH_LATENCY.labels("true").observe(time.perf_counter() - started)
+        return cached
+    data = governor.call_sync("serpapi", "", lambda: checked(http_client.get(SERPAPI_URL, params=params))).json()
+    SEARCH_LATENCY.labels("false").observe(time.perf_counter() - started)
+    if "error" not in data:
+        cache.put(params, data)
+    return data
+
+
+async def asearch(params: dict) -> dict:
+    params = {"engine": "google", **params}
+    started = time.perf_counter()
+    cache = get_cache()
+    cached = cache.get(params)
+    if cached is not None:
+        SEARCH_LATENCY.labels("true").observe(time.perf_counter() - started)
+        return cached
+    client = http_client.get_async_client()
+
+    async def fetch():
+        return checked(await client.get(SERPAPI_URL, params=params))
+
+    data = (await governor.call("serpapi", "", fetch)).json()
+    SEARCH_LATENCY.labels("false").observe(time.perf_counter() - started)
+    if "error" not in data:
+        cache.put(params, data)
+    return data
@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from utils.db import open_db, shared
+
+SERP_CACHE_PATH = os.getenv("SERP_CACHE_PATH", ".cache/serp.sqlite")
+SERP_CACHE_TTL = float(os.getenv("SERP_CACHE_TTL", str(24 * 3600)))
+SERP_CACHE_MAX_ENTRIES = int(os.getenv("SERP_CACHE_MAX_ENTRIES", "5000"))
+
+# Params that do not change the result set
+IGNORED_PARAMS = {"api_key", "source", "output"}
+
+
+def normalize_query(query: str) -> str:
+    query = re.sub(r"\s+", " ", query.lower()).strip()
+    return query.rstrip("?!. ")
+
+
+def cache_key(params: dict) -> str:
+    parts = {k: str(v) for k, v in params.items() if k not in IGNORED_PARAMS}
+    parts["q"] = normalize_query(parts.get("q", ""))
+    return hashlib.sha1(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+class SerpCache:
+    def __init__(self, path=SERP_CACHE_PATH, ttl=SERP_CACHE_TTL, max_entries=SERP_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._db = open_db(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS serp ("
+            "key TEXT PRIMARY KEY, query TEXT, response TEXT, created REAL, accessed REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS serp_accessed ON serp (accessed)")
+
+    def get(self, params: dict):
+        key = cache_key(params)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT response, created FROM serp WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            if now - row[1] > self.ttl:
+                self._db.execute("DELETE FROM serp WHERE key = ?", (key,))
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._db.execute("UPDATE serp SET accessed = ? WHERE key = ?", (now, key))
+            self.stats["hits"] += 1
+        return json.loads(row[0])
+
+    def put(self, params: dict, response: dict):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO serp (key, query, response, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (cache_key(params), normalize_query(params.get("q", "")), json.dumps(response), now, now)
+            )
+            # Size-bounded LRU: drop the least recently used rows beyond the limit
+            overflow = self._db.execute("SELECT COUNT(*) FROM serp").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._db.execute(
+                    "DELETE FROM serp WHERE key IN (SELECT key FROM serp ORDER BY accessed LIMIT ?)", (overflow,)
+                )
+                self.stats["evictions"] += overflow
+
+    def info(self) -> dict:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM serp").fetchone()[0]
+        return {**self.stats, "entries": entries, "max_entries": self.max_entries, "ttl": self.ttl}
+
+
+get_cache = shared(SerpCache)
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+
+from utils.db import open_db
+
+SINGLE_FLIGHT_PATH = os.getenv("SINGLE_FLIGHT_PATH", ".cache/flights.sqlite")
+# A leader that stops renewing its lease for this long is presumed dead and another worker takes over
+SINGLE_FLIGHT_LEASE = float(os.getenv("SINGLE_FLIGHT_LEASE", "30"))
+# Finished results stay visible this long for followers that are still polling
+SINGLE_FLIGHT_GRACE = float(os.getenv("SINGLE_FLIGHT_GRACE", "5"))
+SINGLE_FLIGHT_POLL = float(os.getenv("SINGLE_FLIGHT_POLL", "0.25"))
+
+
+class Flight:
+    # Events of one in-process execution, replayed to every caller attached to it
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self.changed = asyncio.Condition()
+        self.followers = 0
+        self.task = None
+
+    async def publish(self, event, data=None, done=False):
+        async with self.changed:
+            if event is not None:
+                self.events.append((event, data))
+            self.done = self.done or done
+            self.changed.notify_all()
+
+    async def follow(self):
+        seen = 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: len(self.events) > seen or self.done)
+                events, finished = self.events[seen:], self.done
+            seen += len(events)
+            for event in events:
+                yield event
+            if finished and seen == len(self.events):
+                return
+
+
+class SingleFlight:
+    # Concurrent callers with the same key share one execution: callers in this process follow its
+    # events live, callers in other worker processes wait on a SQLite row for its final result
+    def __init__(self, path=SINGLE_FLIGHT_PATH, lease=SINGLE_FLIGHT_LEASE, grace=SINGLE_FLIGHT_GRACE):
+        self.lease = lease
+        self.grace = grace
+        self.owner = uuid.uuid4().hex
+        self.stats = {"leaders": 0, "local_followers": 0, "remote_followers": 0, "takeovers": 0,
+                      "abandoned": 0}
+        self._flights = {}
+        self._tasks = set()
+        self._lock = threading.Lock()
+        self._db = open_db(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS flights (key TEXT PRIMARY KEY, owner TEXT, expires REAL, result TEXT)"
+        )
+
+    def _claim(self, key: str) -> bool:
+        now = time.time()
+        with self._lock:
+            self._db.execute("DELETE FROM flights WHERE expires < ?", (now,))
+            return bool(self._db.execute(
+                "INSERT OR IGNORE INTO flights VALUES (?, ?, ?, NULL)", (key, self.owner, now + self.lease)
+            ).rowcount)
+
+    def _renew(self, key: str):
+        with self._lock:
+            self._db.execute(
+                "UPDATE flights SET expires = ? WHERE key = ? AND owner = ? AND result IS NULL",
+                (time.time() + self.lease, key, self.owner)
+            )
+
+    def _finish(self, key: str, result):
+        with self._lock:
+            if result is None:
+                # Nothing to share, let the next caller start over
+                self._db.execute("DELETE FROM flights WHERE key = ? AND owner = ?", (key, self.owner))
+                return
+            self._db.execute(
+                "UPDATE flights SET expires = ?, result = ? WHERE key = ? AND owner = ?",
+                (time.time() + self.grace, json.dumps(result), key, self.owner)
+            )
+
+    def _peek(self, key: str):
+        # (exists, result) for a live row
+        with self._lock:
+            row = self._db.execute(
+                "SELECT result FROM flights WHERE key = ? AND expires >= ?", (key, time.time())
+            ).fetchone()
+        return (row is not None), (json.loads(row[0]) if row and row[0] is not None else None)
+
+    def _drop(self, key: str, flight: Flight):
+        # A newer flight may already run under the same key
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    async def _lead(self, key: str, flight: Flight, produce):
+        renewing = asyncio.create_task(self._keep_lease(key))
+        result = None
+        try:
+            async for event, data in produce():
+                if event == "result":
+                    result = data
+                await flight.publish(event, data)
+        except Exception as e:
+            print(f"❌ Coalesced execution failed: {e}")
+            result = {"status": "error", "error": str(e), "pipeline_trace": []}
+            await flight.publish("result", result)
+        finally:
+            renewing.cancel()
+            self._finish(key, result)
+            self._drop(key, flight)
+            await flight.publish(None, done=True)
+
+    async def _follow(self, key: str, flight: Flight):
+        # The execution outlives any one caller going away, but not all of them: once nobody in this
+        # process is listening it is cancelled, and callers in other processes take over
+        flight.followers += 1
+        try:
+            async for event in flight.follow():
+                yield event
+        finally:
+            flight.followers -= 1
+            if not flight.followers and not flight.done and flight.task is not None:
+                self.stats["abandoned"] += 1
+                self._drop(key, flight)
+                flight.task.cancel()
+
+    async def _keep_lease(self, key: str):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            self._renew(key)
+
+    async def run(self, key: str, produce):
+        # `produce` is a zero-argument callable returning an async generator of (event, data);
+        # yields the same events to every concurrent caller with this key
+        while True:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.stats["local_followers"] += 1
+                async for event in self._follow(key, flight):
+                    yield event
+                return
+
+            if self._claim(key):
+                self.stats["leaders"] += 1
+                flight = self._flights[key] = Flight()
+                # Runs detached so the leader's caller disconnecting does not fail its followers
+                task = flight.task = asyncio.create_task(self._lead(key, flight, produce))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+                async for event in self._follow(key, flight):
+                    yield event
+                return
+
+            self.stats["remote_followers"] += 1
+            while True:
+                exists, result = self._peek(key)
+                if result is not None:
+                    for step in result.get("pipeline_trace", []):
+                        yield "trace", step
+                    yield "result", result
+                    return
+                if not exists:
+                    # The leader finished without a result or died, try to take over
+                    self.stats["takeovers"] += 1
+                    break
+                await asyncio.sleep(SINGLE_FLIGHT_POLL)
+
+    def info(self) -> dict:
+        return {**self.stats, "in_flight": len(self._flights)}
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+from collections import deque
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class Slots:
+    # Concurrency caps per key, counted across threads and event loops. Waiters queue in arrival order
+    # and a leaving caller hands its slot straight to the oldest one, so nobody can jump the queue.
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.stats = {"queued": 0}
+        self._active = {}
+        self._waiters = {}  # key -> deque of callables that wake one waiter
+        self._lock = threading.Lock()
+
+    def _take(self, key) -> bool:
+        # Caller holds the lock
+        if self._waiters.get(key) or self._active.get(key, 0) >= self.limit:
+            return False
+        self._active[key] = self._active.get(key, 0) + 1
+        return True
+
+    def _queue(self, key, wake):
+        self._waiters.setdefault(key, deque()).append(wake)
+        self.stats["queued"] += 1
+
+    def _unqueue(self, key, wake) -> bool:
+        # False once the waiter has already been handed a slot
+        waiters = self._waiters.get(key)
+        if not waiters or wake not in waiters:
+            return False
+        waiters.remove(wake)
+        if not waiters:
+            del self._waiters[key]
+        return True
+
+    def try_enter(self, key="") -> bool:
+        with self._lock:
+            return self._take(key)
+
+    def leave(self, key=""):
+        with self._lock:
+            waiters = self._waiters.get(key)
+            if waiters:
+                # The slot stays taken and passes to the oldest waiter
+                wake = waiters.popleft()
+                if not waiters:
+                    del self._waiters[key]
+            else:
+                wake = None
+                self._active[key] -= 1
+                if not self._active[key]:
+                    del self._active[key]
+        if wake is not None:
+            wake()
+
+    async def enter(self, key=""):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                # The waiter's loop is gone, pass the slot on
+                self.leave(key)
+
+        with self._lock:
+            if self._take(key):
+                return
+            self._queue(key, wake)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                queued = self._unqueue(key, wake)
+            if not queued:
+                self.leave(key)
+            raise
+
+    def enter_sync(self, key=""):
+        ready = threading.Event()
+        with self._lock:
+            if self._take(key):
+                return
+            self._queue(key, ready.set)
+        ready.wait()
+
+    def active(self, key=None) -> int:
+        with self._lock:
+            return sum(self._active.values()) if key is None else self._active.get(key, 0)
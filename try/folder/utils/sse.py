@@ -0,0 +1,57 @@
+import json
+
+from utils import http_client, wire
+
+# Keep proxies from buffering the stream
+HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def format_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def encode(events):
+    # (event, data) async generator -> text/event-stream body
+    async for event, data in events:
+        yield format_event(event, data)
+
+
+class EventParser:
+    def __init__(self):
+        self.event = "message"
+        self.data = []
+
+    def feed(self, line: str):
+        # Returns (event, data) once a blank line ends an event, None otherwise
+        if line == "":
+            if not self.data:
+                return None
+            event, data = self.event, json.loads("\n".join(self.data))
+            self.event, self.data = "message", []
+            return event, data
+        if line.startswith("event:"):
+            self.event = line[6:].strip()
+        elif line.startswith("data:"):
+            self.data.append(line[5:].lstrip())
+        return None
+
+
+async def relay(url: str, payload: dict, timeout=60):
+    # POST to an upstream SSE endpoint and yield its events as they arrive
+    parser = EventParser()
+    client = http_client.get_async_client()
+    async with client.stream("POST", url, timeout=timeout, **wire.json_body(payload)) as resp:
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            parsed = parser.feed(line.rstrip("\r"))
+            if parsed:
+                yield parsed
+
+
+def iter_events(response):
+    # Same as relay() for a streaming requests.Response
+    parser = EventParser()
+    for line in response.iter_lines(decode_unicode=True):
+        parsed = parser.feed((line or "").rstrip("\r"))
+        if parsed:
+            yield parsed
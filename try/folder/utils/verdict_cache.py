@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from utils.db import open_db
+
+VERDICT_CACHE_SIZE = int(os.getenv("VERDICT_CACHE_SIZE", "2048"))
+# Leave empty to keep the cache in memory only
+VERDICT_CACHE_PATH = os.getenv("VERDICT_CACHE_PATH", ".cache/verdicts.sqlite")
+VERDICT_CACHE_TTL = float(os.getenv("VERDICT_CACHE_TTL", str(7 * 24 * 3600)))
+
+
+def content_hash(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class VerdictCache:
+    # In-memory LRU in front of an optional SQLite tier
+    def __init__(self, size=VERDICT_CACHE_SIZE, path=VERDICT_CACHE_PATH, ttl=VERDICT_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "expired": 0}
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = open_db(path)
+            self._db.execute("CREATE TABLE IF NOT EXISTS verdicts (key TEXT PRIMARY KEY, verdict TEXT, created REAL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS verdicts_created ON verdicts (created)")
+
+    def _remember(self, key, verdict):
+        self._memory[key] = verdict
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.size:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str):
+        with self._lock:
+            verdict = self._memory.get(key)
+            if verdict is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return verdict
+            if self._db is not None:
+                row = self._db.execute("SELECT verdict, created FROM verdicts WHERE key = ?", (key,)).fetchone()
+                if row and time.time() - row[1] <= self.ttl:
+                    verdict = json.loads(row[0])
+                    self._remember(key, verdict)
+                    self.stats["disk_hits"] += 1
+                    return verdict
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: str, verdict: dict):
+        with self._lock:
+            self._remember(key, verdict)
+            if self._db is not None:
+                now = time.time()
+                self._db.execute("INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?)", (key, json.dumps(verdict), now))
+                # TTL is only checked on read, so expired rows are dropped here or the table would grow forever
+                self.stats["expired"] += self._db.execute(
+                    "DELETE FROM verdicts WHERE created < ?", (now - self.ttl,)
+                ).rowcount
+            self.stats["stores"] += 1
+
+    def info(self) -> dict:
+        lookups = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+        hits = lookups - self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_ratio": round(hits / lookups, 3) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_size": self.size,
+            "disk": self._db is not None
+        }
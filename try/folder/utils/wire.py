@@ -0,0 +1,64 @@
+import gzip
+import json
+import os
+
+from starlette.datastructures import MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware
+
+# Gzip request bodies between agents; every agent decodes them, so only the sender needs the flag
+WIRE_GZIP = os.getenv("WIRE_GZIP", "false").lower() in ("1", "true", "yes")
+WIRE_GZIP_MIN_SIZE = int(os.getenv("WIRE_GZIP_MIN_SIZE", "1024"))
+
+
+def json_body(payload) -> dict:
+    # Keyword arguments for an httpx request carrying `payload` as JSON
+    if not WIRE_GZIP:
+        return {"json": payload}
+    body = json.dumps(payload).encode("utf-8")
+    if len(body) < WIRE_GZIP_MIN_SIZE:
+        return {"content": body, "headers": {"Content-Type": "application/json"}}
+    return {
+        "content": gzip.compress(body, compresslevel=6),
+        "headers": {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+    }
+
+
+class GzipRequestMiddleware:
+    # Inflates gzip encoded request bodies before they reach the route
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = MutableHeaders(scope=scope)
+        if headers.get("content-encoding", "").lower() != "gzip":
+            await self.app(scope, receive, send)
+            return
+
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        body = gzip.decompress(b"".join(chunks))
+        del headers["content-encoding"]
+        headers["content-length"] = str(len(body))
+        sent = False
+
+        async def inflated():
+            nonlocal sent
+            if sent:
+                return await receive()
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        await self.app(scope, inflated, send)
+
+
+def install(app):
+    # Responses are compressed whenever the caller sends Accept-Encoding: gzip (httpx does by default)
+    app.add_middleware(GzipRequestMiddleware)
+    app.add_middleware(GZipMiddleware, minimum_size=WIRE_GZIP_MIN_SIZE)